@@ -0,0 +1,95 @@
+# SpeedO startup benchmark: wall time of `--help` and a single-ping run.
+#
+# Usage:
+#   python3 benchmarks/bench_startup.py [-n 20] [--json startup.json]
+#
+# The single-ping run uses the native engine against a local `speedo serve`, so it needs
+# no network and measures SpeedO's own overhead (interpreter start, imports, setup, exit).
+
+import argparse
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SPEEDO = os.path.join(ROOT, "speedo.py")
+
+# Pick a free local port for the bundled server
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+# Wait until the server accepts connections
+def wait_for_port(port, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"speedo serve did not start on port {port}")
+
+# Run a command `runs` times and return wall times in milliseconds
+def time_command(cmd, runs, cwd):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(cmd, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+def summarize(times):
+    return {
+        "runs": len(times),
+        "min_ms": round(min(times), 1),
+        "median_ms": round(statistics.median(times), 1),
+        "max_ms": round(max(times), 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="SpeedO startup benchmark")
+    parser.add_argument("-n", "--runs", type=int, help="Runs per scenario", default=20)
+    parser.add_argument("--json", dest="json_path", help="Write results to this JSON file", default=None)
+    args = parser.parse_args()
+
+    port = free_port()
+    echo_port = free_port()
+    server = subprocess.Popen([sys.executable, SPEEDO, "serve", "--host", "127.0.0.1", "--port", str(port),
+                               "--echo-port", str(echo_port)], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    # Throwaway working directory so the single-ping run's CSV logs do not pile up in the repo
+    workdir = os.path.join(ROOT, "benchmarks", ".startup")
+    os.makedirs(workdir, exist_ok=True)
+    try:
+        wait_for_port(port)
+        scenarios = {
+            "import": [sys.executable, "-c", f"import sys; sys.path.insert(0, {ROOT!r}); import speedo"],
+            "help": [sys.executable, SPEEDO, "--help"],
+            "single_ping": [sys.executable, SPEEDO, "--headless", "-T", "P", "-P", "1",
+                            "-E", "native", "--endpoint", f"http://127.0.0.1:{port}", "--echo-port", str(echo_port)],
+        }
+        results = {}
+        for name, cmd in scenarios.items():
+            time_command(cmd, 1, workdir)  # warm the filesystem and bytecode caches
+            results[name] = summarize(time_command(cmd, args.runs, workdir))
+            r = results[name]
+            print(f"{name:<12} median {r['median_ms']:>7.1f} ms  min {r['min_ms']:>7.1f} ms  max {r['max_ms']:>7.1f} ms")
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json_path:
+        results["python"] = sys.version.split()[0]
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.json_path}")
+
+if __name__ == "__main__":
+    main()
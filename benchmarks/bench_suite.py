@@ -0,0 +1,218 @@
+# SpeedO benchmark suite: SpeedO's own overhead with the network taken out of the picture.
+#
+# Usage:
+#   python3 benchmarks/bench_suite.py [--quick] [--json results.json] [--compare baseline.json]
+#
+# A deterministic stand-in replaces the speedtest-cli binary (a shell script on PATH that
+# prints fixed JSON) and ping3.ping (returns a fixed RTT), and sleeps are recorded instead
+# of slept. Macro benchmarks report wall time per run_speed_test() call / stress_test()
+# iteration, the time spent in the stand-in backend, and the difference (SpeedO overhead);
+# replay_row times one replayed row, i.e. the per-iteration pipeline with no backend at all.
+# Micro benchmarks report per-call cost and calls/second of the hot helpers.
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import speedo  # noqa: E402
+
+FAKE_RESULT = {
+    "download": 250_000_000.0,
+    "upload": 50_000_000.0,
+    "ping": 12.5,
+    "server": {"latency": 14.2},
+    "bytes_sent": 62_500_000,
+    "bytes_received": 312_500_000,
+}
+FAKE_RTT = 0.0125
+FAKE_ROW = {"download": 250.0, "upload": 50.0, "ping": 12.5, "jitter": 1.3, "latency": 14.2}
+REGRESSION_THRESHOLD = 0.10  # --compare flags anything 10% slower than the baseline
+
+# Put a speedtest-cli stand-in on PATH that prints FAKE_RESULT immediately
+def install_fake_speedtest_cli(bin_dir):
+    path = os.path.join(bin_dir, "speedtest-cli")
+    with open(path, "w") as f:
+        f.write("#!/bin/sh\n")
+        f.write(f"printf '%s\\n' '{json.dumps(FAKE_RESULT)}'\n")
+    os.chmod(path, 0o755)
+    os.environ["PATH"] = bin_dir + os.pathsep + os.environ.get("PATH", "")
+    return path
+
+# Replace ping3 and time.sleep; sleeps are added up instead of slept
+def install_fakes():
+    slept = [0.0]
+
+    def fake_sleep(seconds):
+        slept[0] += max(0, seconds)
+
+    speedo.ping = lambda host, timeout=4: FAKE_RTT
+    speedo.time.sleep = fake_sleep
+    return slept
+
+# Median wall time of the stand-in alone, i.e. what a perfect tool would still pay per call
+def backend_baseline(fake, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([fake, "--json"], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+def bench_run_speed_test(runs, backend, slept):
+    times = []
+    for _ in range(runs):
+        slept[0] = 0.0
+        start = time.perf_counter()
+        speedo.run_speed_test("ALL", ping_samples=5, timeout=1000)
+        times.append(time.perf_counter() - start)
+    wall = statistics.median(times)
+    return {
+        "calls": runs,
+        "wall_ms": round(wall * 1000, 3),
+        "backend_ms": round(backend * 1000, 3),
+        "overhead_ms": round((wall - backend) * 1000, 3),
+        "skipped_sleep_ms": round(slept[0] * 1000, 1),
+    }
+
+def bench_stress_iteration(seconds, backend, headless):
+    calls = [0]
+    real_run = speedo.run_speed_test
+
+    def counting_run(*args, **kwargs):
+        calls[0] += 1
+        return real_run(*args, **kwargs)
+
+    speedo.run_speed_test = counting_run
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            speedo.stress_test(seconds, "ALL", ping_samples=5, timeout=1000, headless=headless, max_fps=0)
+            elapsed = time.perf_counter() - start
+    finally:
+        speedo.run_speed_test = real_run
+    per_iteration = elapsed / max(calls[0], 1)
+    return {
+        "iterations": calls[0],
+        "wall_ms": round(per_iteration * 1000, 3),
+        "backend_ms": round(backend * 1000, 3),
+        "overhead_ms": round((per_iteration - backend) * 1000, 3),
+    }
+
+# Aggregation, scoring, logging and rendering alone: synthetic rows fed through `speedo replay`'s path
+def bench_replay(rows, headless):
+    start_time = datetime(2025, 1, 1)
+    recorded = [(start_time + timedelta(seconds=i), dict(FAKE_ROW, download=FAKE_ROW["download"] + i % 50))
+                for i in range(rows)]
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        speedo.stress_test(None, replay=iter(recorded), headless=headless, max_fps=0)
+        elapsed = time.perf_counter() - start
+    per_row = elapsed / rows
+    return {"rows": rows, "wall_ms": round(per_row * 1000, 3), "backend_ms": 0.0, "overhead_ms": round(per_row * 1000, 3)}
+
+# Per-call time and calls/second using timeit's auto-ranging
+def micro(stmt, repeat):
+    timer = timeit.Timer(stmt)
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat=repeat, number=number)) / number
+    return {"per_call_us": round(best * 1_000_000, 3), "calls_per_sec": round(1 / best)}
+
+def run_micro(repeat):
+    result = dict(FAKE_ROW)
+    view = speedo.LiveView(0, io.StringIO())
+    lines = [f"line {i}" for i in range(7)]
+    log_file = speedo.init_log_file()
+    logger = speedo.CsvLogger(flush_rows=100)
+    try:
+        return {
+            "calculate_health_score": micro(lambda: speedo.calculate_health_score(250.0, 50.0, 12.5, 1.3, 14.2), repeat),
+            "log_to_csv": micro(lambda: speedo.log_to_csv(log_file, result, 95.5), repeat),
+            "CsvLogger.log": micro(lambda: logger.log(result, 95.5), repeat),
+            "render_ascii_bar": micro(lambda: speedo.render_ascii_bar("Download", 250.0, 1000.0), repeat),
+            "render_health_bar": micro(lambda: speedo.render_health_bar(95.5), repeat),
+            "LiveView.update": micro(lambda: view.update(lines), repeat),
+        }
+    finally:
+        logger.close()
+
+# Print the relative change against a previous results file and return the regressions
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    regressions = []
+    print(f"\n=== Compared with {baseline_path} ===")
+    for group in ("macro", "micro"):
+        for name, current in results[group].items():
+            old = baseline.get(group, {}).get(name)
+            key = "overhead_ms" if group == "macro" else "per_call_us"
+            if not old or not old.get(key):
+                continue
+            change = (current[key] - old[key]) / old[key]
+            flag = "  REGRESSION" if change > REGRESSION_THRESHOLD else ""
+            print(f"  {name:<28} {old[key]:>10.3f} -> {current[key]:>10.3f} {key} ({change:+.1%}){flag}")
+            if flag:
+                regressions.append(name)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="SpeedO benchmark suite")
+    parser.add_argument("--quick", action="store_true", help="Fewer runs, for a fast sanity check")
+    parser.add_argument("--json", dest="json_path", help="Write results to this JSON file", default=None)
+    parser.add_argument("--compare", help="Baseline JSON to compare against (exit 1 on regressions)", default=None)
+    args = parser.parse_args()
+
+    runs, stress_seconds, repeat, replay_rows = (5, 1, 3, 2000) if args.quick else (30, 5, 7, 20000)
+    workdir = tempfile.mkdtemp(prefix="speedo-bench-")
+    cwd = os.getcwd()
+    os.chdir(workdir)  # stress_test and the loggers write into ./logs
+    try:
+        fake = install_fake_speedtest_cli(workdir)
+        slept = install_fakes()
+        backend = backend_baseline(fake, runs)
+        results = {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "macro": {
+                "run_speed_test": bench_run_speed_test(runs, backend, slept),
+                "stress_iteration": bench_stress_iteration(stress_seconds, backend, headless=False),
+                "stress_iteration_headless": bench_stress_iteration(stress_seconds, backend, headless=True),
+                "replay_row": bench_replay(replay_rows, headless=False),
+                "replay_row_headless": bench_replay(replay_rows, headless=True),
+            },
+            "micro": run_micro(repeat),
+        }
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print("=== Macro (per call / iteration) ===")
+    for name, r in results["macro"].items():
+        print(f"  {name:<28} wall {r['wall_ms']:>8.3f} ms  backend {r['backend_ms']:>8.3f} ms  overhead {r['overhead_ms']:>8.3f} ms")
+    print("=== Micro ===")
+    for name, r in results["micro"].items():
+        print(f"  {name:<28} {r['per_call_us']:>10.3f} us/call  {r['calls_per_sec']:>12,} calls/s")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.json_path}")
+    if args.compare and compare(results, args.compare):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
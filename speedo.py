@@ -12,26 +12,64 @@ import os
 import sys
 import statistics
 import json
-import subprocess
 from datetime import datetime
 import signal
 import csv
+import io
+import struct
+import threading
+import math
+import functools
+from collections import deque
+from array import array
 
-try:
-    from ping3 import ping
-except ImportError:
-    print("Installing ping3...")
-    os.system("pip install ping3")
-    from ping3 import ping
+# asyncio (with ssl) costs more to import than the rest of SpeedO, so it and the other
+# network modules load on first use
+class _LazyModule:
+    def __init__(self, name):
+        self._name = name
 
-try:
-    from colorama import Fore, Style, init
-except ImportError:
-    print("Installing colorama...")
-    os.system("pip install colorama")
-    from colorama import Fore, Style, init
+    def __getattr__(self, attr):
+        import importlib
+        module = importlib.import_module(self._name)
+        globals()[self._name] = module  # later lookups skip the proxy
+        return getattr(module, attr)
 
-init(autoreset=True)
+asyncio = _LazyModule("asyncio")
+ssl = _LazyModule("ssl")
+socket = _LazyModule("socket")
+
+# Stand-in for colorama's Fore/Style until colors are enabled (and in headless runs)
+class _NoColor:
+    def __getattr__(self, name):
+        return ""
+
+Fore = Style = _NoColor()
+ping = None  # ping3.ping once loaded; benchmarks can patch in a stand-in
+
+# Optional dependencies are imported when needed and never installed at runtime
+def _require(module, package):
+    import importlib
+    try:
+        return importlib.import_module(module)
+    except ImportError:
+        print(f"{package} is not installed. Install it with: pip install {package}")
+        sys.exit(1)
+
+def enable_color():
+    global Fore, Style
+    colorama = _require("colorama", "colorama")
+    colorama.init(autoreset=True)
+    Fore, Style = colorama.Fore, colorama.Style
+
+def load_ping():
+    global ping
+    if ping is None:
+        ping = _require("ping3", "ping3").ping
+    return ping
+
+def _ping(host, timeout):
+    return (ping or load_ping())(host, timeout=timeout)
 
 # ASCII branding
 BANNER = r"""
@@ -54,53 +92,958 @@ STRESS_MODES = {
     'Y': 31557600
 }
 
+# Native engine defaults
+NATIVE_STREAMS = 4
+NATIVE_DURATION = 10
+NATIVE_BUFFER_SIZE = 256 * 1024
+NATIVE_UPLOAD_BYTES = 1 << 40
+NATIVE_DOWNLOAD_PATH = "/download"
+NATIVE_UPLOAD_PATH = "/upload"
+NATIVE_PING_CONNECTS = 3  # bare TCP connects timed by ping-only (-T P) runs
+NATIVE_CONNECT_TIMEOUT = 5
+
+# In-process speedtest backend: config + best server cache
+SPEEDTEST_CACHE_FILE = os.path.join(os.path.expanduser("~"), ".cache", "speedo", "speedtest.json")
+SPEEDTEST_CACHE_TTL = 3600
+_speedtest_state = {}  # server id (None = auto-selected) -> {"client", "expires"}
+
+# Latency-under-load (bufferbloat) probing
+BUFFERBLOAT_IDLE_SECONDS = 2
+BUFFERBLOAT_INTERVAL = 0.2
+BUFFERBLOAT_GRADES = [(5, "A+"), (30, "A"), (60, "B"), (200, "C"), (400, "D")]
+BUFFERBLOAT_FIELDS = [
+    ("idle_latency", "idle_latency_ms"),
+    ("loaded_latency", "loaded_latency_ms"),
+    ("bufferbloat", "bufferbloat_ms"),
+    ("bufferbloat_grade", "bufferbloat_grade"),
+]
+
+# Multi-host prober defaults
+PROBE_INTERVAL = 0.2
+PROBE_MAX_WORKERS = 256
+
+# Binary result log: header + fixed-width records (float64 timestamp, float32 metrics)
+BINLOG_MAGIC = b"SPEEDO\x00\x01"
+BINLOG_VERSION = 1
+BINLOG_HEADER = struct.Struct("<8sHHI")  # magic, schema version, field count, names length
+BINLOG_FIELDS = ["download", "upload", "ping", "jitter", "latency", "score"]
+
+# Sparse time index sidecar (<log>.idx): one (epoch, byte offset) entry per block of rows
+INDEX_MAGIC = b"SPDOIDX1"
+INDEX_ENTRY = struct.Struct("<dQ")
+INDEX_BLOCK_ROWS = 256
+
+# Round-robin store: raw samples for an hour, 1-minute rollups for a day, 1-hour rollups for a year
+RRD_MAGIC = b"SPEEDRRD"
+RRD_VERSION = 1
+RRD_FIELDS = ["download", "upload", "ping", "jitter", "latency", "score"]
+RRD_RAW_SLOTS = 3600
+RRD_RAW_SPAN = 3600
+RRD_TIERS = {"minute": (60, 1440), "hour": (3600, 8784)}  # step seconds, slots
+RRD_HEADER = struct.Struct("<8sHHIIIQ")  # magic, version, fields, raw/minute/hour slots, raw cursor
+RRD_DEFAULT_PATH = "logs/speedo.rrd"
+
+# Deadline-based iteration scheduling
+OVERRUN_POLICIES = ["skip", "immediate", "coalesce"]
+SCHEDULE_TOLERANCE = 0.05  # fraction of the interval a start may slip before it counts as an overrun
+SCHEDULE_FIELDS = [("schedule_lag", "schedule_lag_ms")]
+
+# AI Health Score weights, shared by the live scorer and `speedo rescore`:
+# each penalty is value / *_ms_per_point capped at *_cap; throughput earns *_points at *_full_mbps
+HEALTH_WEIGHTS = {
+    "ping_ms_per_point": 2, "ping_cap": 20,
+    "jitter_ms_per_point": 2, "jitter_cap": 15,
+    "latency_ms_per_point": 2, "latency_cap": 15,
+    "bufferbloat_ms_per_point": 20, "bufferbloat_cap": 10,
+    "download_full_mbps": 100, "download_points": 30,
+    "upload_full_mbps": 100, "upload_points": 20,
+}
+RESCORE_DEFAULT_OUT = "logs/rescored"
+
+# Metrics tracked across stress iterations
+STAT_KEYS = ["download", "upload", "ping", "jitter", "latency", "bufferbloat"]
+QUANTILES = [50, 90, 99, 99.9]
+SKETCH_ACCURACY = 0.01
+SKETCH_MAX_BUCKETS = 2048
+
+# Log report: CSV column -> metric key
+REPORT_COLUMNS = {
+    "download_mbps": "download",
+    "upload_mbps": "upload",
+    "ping_ms": "ping",
+    "jitter_ms": "jitter",
+    "latency_ms": "latency",
+    "bufferbloat_ms": "bufferbloat",
+    "ai_health_score": "score",
+}
+REPORT_BUCKETS = {"hour": "%Y-%m-%d %H:00", "day": "%Y-%m-%d"}
+REPORT_BUCKET_LABELS = {"hour": "Hourly", "day": "Daily"}
+HEALTH_STATUSES = ["Excellent", "Good", "Fair", "Poor", "Critical"]
+
+# Agent/collector wire format: [u32 payload length][u8 frame type][payload]
+COLLECTOR_PORT = 9400
+FRAME_HEADER = struct.Struct("<IB")
+FRAME_HELLO = 1  # JSON: agent id, version, fields
+FRAME_BATCH = 2  # u16 record count, u32 dropped so far, then records
+BATCH_HEADER = struct.Struct("<HI")
+AGENT_FIELDS = ["download", "upload", "ping", "jitter", "latency", "bufferbloat", "score"]
+AGENT_RECORD = struct.Struct("<d" + "f" * len(AGENT_FIELDS))
+AGENT_QUEUE_SIZE = 10000
+AGENT_BATCH_SIZE = 256
+AGENT_FLUSH_INTERVAL = 1.0
+MAX_FRAME_SIZE = 1 << 20
+
+# OpenMetrics exporter: (result key, metric name, help, histogram bucket bounds)
+METRICS_HOST = "127.0.0.1"
+METRICS_SERIES = [
+    ("download", "download_mbps", "Download throughput in Mbps", [1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]),
+    ("upload", "upload_mbps", "Upload throughput in Mbps", [1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]),
+    ("ping", "ping_ms", "Ping in milliseconds", [1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000]),
+    ("jitter", "jitter_ms", "Jitter in milliseconds", [0.5, 1, 2.5, 5, 10, 25, 50, 100, 250]),
+    ("latency", "latency_ms", "Server latency in milliseconds", [1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000]),
+    ("score", "health_score", "AI health score (0-100)", [10, 20, 30, 40, 50, 60, 70, 80, 90, 100]),
+]
+
+# Intra-test throughput timeline (native engine): one Mbps sample per slice
+TIMELINE_INTERVAL = 0.1
+TIMELINE_RAMP_FRACTION = 0.9  # ramp ends at the first slice within 90% of the steady median
+TIMELINE_KEYS = ["timeline", "download_steady", "download_ramp", "upload_steady", "upload_ramp", "download_duration", "upload_duration"]
+TIMELINE_FIELDS = [
+    ("download_steady", "download_steady_mbps"),
+    ("download_ramp", "download_ramp_ms"),
+    ("upload_steady", "upload_steady_mbps"),
+    ("upload_ramp", "upload_ramp_ms"),
+]
+
+# Adaptive early stopping (--adaptive, native engine): after the minimum duration, a direction
+# ends once every rolling 1 s estimate over the last second lies within +/- the band (percent)
+# of their mean; --duration stays the upper bound
+ADAPTIVE_BAND = 5
+ADAPTIVE_MIN_DURATION = 2
+ADAPTIVE_WINDOW = 10  # timeline slices per rolling estimate, and estimates that must agree
+ADAPTIVE_FIELDS = [("download_duration", "download_duration_s"), ("upload_duration", "upload_duration_s")]
+
+# Phase timings (--profile); each row's phase columns cover the time since the previous row
+PHASES = [
+    "spawn",    # starting the speedtest-cli process
+    "backend",  # waiting for the measurement backend
+    "parse",    # decoding speedtest-cli JSON
+    "ping",     # jitter pings / host probes
+    "sleep",    # deliberate sleeps (between pings, idle sampling, between iterations)
+    "render",   # live view
+    "log",      # CSV/binary/RRD/agent/metrics writes
+]
+PHASE_FIELDS = [(f"phase_{name}", f"phase_{name}_ms") for name in PHASES]
+PROFILE_HOOKS = ["cprofile", "pyinstrument"]
+
+# `speedo replay`: logged columns read back into result keys (the score is recomputed);
+# replayed runs log under their own directory so `speedo report` does not count them twice
+REPLAY_COLUMNS = {column: key for column, key in REPORT_COLUMNS.items() if key != "score"}
+REPLAY_COLUMNS.update({column: key for key, column in BUFFERBLOAT_FIELDS + SCHEDULE_FIELDS + TIMELINE_FIELDS})
+REPLAY_DEFAULT_OUT = "logs/replay"
+
+# Live view refresh cap (frames per second)
+LIVE_MAX_FPS = 4
+
+# Bundled server defaults
+SERVE_PORT = 8080
+SERVE_CHUNK_SIZE = 1024 * 1024
+
 # Handle CTRL+C gracefully
 def signal_handler(sig, frame):
     print(Fore.RED + "\nTest aborted by user.")
     sys.exit(0)
 
-signal.signal(signal.SIGINT, signal_handler)
+# Lightweight phase timer: `with timed("ping"):` adds the elapsed time to the current
+# iteration's phase list (--profile) and emits a trace span (--trace); with neither on it
+# only reads the clock. `span` names the trace event when it differs from the phase
+# (phase None = trace only), and `args` can be filled in until the block exits.
+_phase_times = None
+_tracer = None
+
+class timed:
+    __slots__ = ("phase", "span", "args", "start")
+
+    def __init__(self, phase, span=None, args=None):
+        self.phase = phase
+        self.span = span or phase
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        if _phase_times is not None and self.phase:
+            _phase_times.setdefault(self.phase, []).append(end - self.start)
+        if _tracer:
+            _tracer.complete(self.span, self.start, end, self.args)
+
+def enable_phases():
+    global _phase_times
+    _phase_times = {}
+
+# Return the phase durations recorded since the last call and start a new iteration
+def take_phases():
+    global _phase_times
+    times, _phase_times = _phase_times, {}
+    return times
+
+# Chrome trace event writer (chrome://tracing, ui.perfetto.dev): one complete ("X") event per
+# line inside a JSON array. The array is only closed on exit; both viewers accept it unclosed,
+# so a file cut short by a crash stays usable and each line parses once its comma is removed.
+# Timestamps are microseconds on the monotonic clock since the trace started; the first event
+# records the matching wall-clock time.
+class Tracer:
+    def __init__(self, path):
+        self.file = open(path, "wb")
+        self.pid = os.getpid()
+        self.origin = time.perf_counter()
+        self.lock = threading.Lock()
+        self.encode = json.JSONEncoder(separators=(",", ":"), default=str).encode
+        self.file.write(b"[\n")
+        self._write({"name": "process_name", "ph": "M", "pid": self.pid, "tid": 0, "args": {"name": "SpeedO"}})
+        self._write({"name": "trace_start", "ph": "i", "s": "g", "ts": 0, "pid": self.pid, "tid": 0,
+                     "args": {"epoch": time.time(), "time": datetime.now().isoformat(timespec="milliseconds")}})
+
+    def _write(self, event):
+        line = (self.encode(event) + ",\n").encode()
+        with self.lock:
+            self.file.write(line)
+
+    def complete(self, name, start, end, args=None):
+        event = {"name": name, "ph": "X", "pid": self.pid, "tid": threading.get_native_id(),
+                 "ts": round((start - self.origin) * 1_000_000, 3), "dur": round((end - start) * 1_000_000, 3)}
+        if args:
+            event["args"] = args
+        self._write(event)
+
+    def flush(self):
+        with self.lock:
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            self.file.seek(-2, os.SEEK_END)
+            self.file.write(b"\n]\n")
+            self.file.close()
+
+def start_trace(path):
+    global _tracer
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    _tracer = Tracer(path)
+
+def stop_trace():
+    global _tracer
+    if _tracer:
+        _tracer.close()
+        _tracer = None
+
+# Run-wide phase totals for the --profile summary
+class PhaseProfile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.events = {name: RunningStats() for name in PHASES}
+
+    # Fold in one batch from take_phases(); returns the per-phase CSV columns (ms)
+    def add(self, times):
+        columns = {key: 0 for key, _ in PHASE_FIELDS}
+        for name, durations in times.items():
+            events = self.events.setdefault(name, RunningStats())
+            for duration in durations:
+                events.add(duration * 1000)
+            columns[f"phase_{name}"] = round(sum(durations) * 1000, 2)
+        return columns
+
+    def print_summary(self):
+        wall = (time.perf_counter() - self.started) * 1000
+        print(Fore.YELLOW + "\n=== Phase profile ===")
+        print(f"  {'phase':<8} {'events':>7} {'mean ms':>10} {'max ms':>10} {'total s':>9} {'share':>7}")
+        accounted = 0
+        for name, events in self.events.items():
+            if not events.count:
+                continue
+            total = events.mean * events.count
+            accounted += total
+            print(f"  {name:<8} {events.count:>7} {events.mean:>10.2f} {events.max:>10.2f} {total / 1000:>9.2f} {total / wall:>7.1%}")
+        print(f"  {'other':<8} {'':>7} {'':>10} {'':>10} {(wall - accounted) / 1000:>9.2f} {(wall - accounted) / wall:>7.1%}")
+        print(f"  {'wall':<8} {'':>7} {'':>10} {'':>10} {wall / 1000:>9.2f}")
+
+# Run func under cProfile or pyinstrument; with `out` the full profile is saved there
+def run_profiled(hook, out, func, *args):
+    if hook == "pyinstrument":
+        profiler = _require("pyinstrument", "pyinstrument").Profiler()
+        profiler.start()
+        try:
+            return func(*args)
+        finally:
+            profiler.stop()
+            if out:
+                with open(out, "w") as f:
+                    f.write(profiler.output_html())
+                print(Fore.MAGENTA + f"pyinstrument profile: {out}")
+            else:
+                print(profiler.output_text())
+
+    import cProfile
+    import pstats
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func, *args)
+    finally:
+        if out:
+            profiler.dump_stats(out)
+            print(Fore.MAGENTA + f"cProfile stats: {out} (open with python -m pstats or snakeviz)")
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(20)
+
+# Live terminal block: redraws only the lines that changed, at most max_fps times per second
+class LiveView:
+    def __init__(self, max_fps=LIVE_MAX_FPS, stream=None):
+        self.min_interval = 1 / max_fps if max_fps else 0
+        self.stream = stream or sys.stdout
+        self.shown = []
+        self.pending = None
+        self.last_draw = 0
+
+    def update(self, lines):
+        self.pending = lines
+        if time.monotonic() - self.last_draw >= self.min_interval:
+            self.flush()
+
+    # Draw the pending frame now (also used to show the last frame before the summary)
+    def flush(self):
+        if self.pending is None:
+            return
+        lines, self.pending = self.pending, None
+        out = [f"\033[{len(self.shown)}F"] if self.shown else []
+        for i, line in enumerate(lines):
+            if i < len(self.shown) and self.shown[i] == line:
+                out.append("\033[1E")
+            else:
+                out.append(line + Style.RESET_ALL + "\033[K\n")
+        if len(lines) < len(self.shown):
+            out.append("\033[J")
+        # One write per frame keeps slow terminals (SSH) from stalling the loop several times
+        self.stream.write("".join(out))
+        self.stream.flush()
+        self.shown = lines
+        self.last_draw = time.monotonic()
+
+# CSV header/row layout
+# extra_fields: (result key, column name) pairs appended after the standard columns
+def _log_header(extra_fields=()):
+    return [
+        "timestamp", "download_mbps", "upload_mbps",
+        "ping_ms", "jitter_ms", "latency_ms", "ai_health_score"
+    ] + [column for _, column in extra_fields]
+
+def _log_row(result, score, extra_fields=(), timestamp=None):
+    return [
+        (timestamp or datetime.now()).strftime("%Y-%m-%d %H:%M:%S"),
+        result.get("download", "N/A"),
+        result.get("upload", "N/A"),
+        result.get("ping", "N/A"),
+        result.get("jitter", "N/A"),
+        result.get("latency", "N/A"),
+        score
+    ] + [result.get(key, "N/A") for key, _ in extra_fields]
+
+def _new_log_filename(directory="logs"):
+    filename = datetime.now().strftime(f"{directory}/speedo_%Y-%m-%d_%H-%M-%S.csv")
+    suffix = 1
+    while os.path.exists(filename) or os.path.exists(filename + ".gz"):
+        filename = datetime.now().strftime(f"{directory}/speedo_%Y-%m-%d_%H-%M-%S_{suffix}.csv")
+        suffix += 1
+    return filename
 
 # Prepare logs folder & file
-def init_log_file():
+def init_log_file(extra_fields=()):
     os.makedirs("logs", exist_ok=True)
-    filename = datetime.now().strftime("logs/speedo_%Y-%m-%d_%H-%M-%S.csv")
+    filename = _new_log_filename()
     with open(filename, "w", newline="") as f:
         writer = csv.writer(f)
-        writer.writerow([
-            "timestamp", "download_mbps", "upload_mbps",
-            "ping_ms", "jitter_ms", "latency_ms", "ai_health_score"
-        ])
+        writer.writerow(_log_header(extra_fields))
     return filename
 
-def log_to_csv(filename, result, score):
+def log_to_csv(filename, result, score, extra_fields=()):
     with open(filename, "a", newline="") as f:
         writer = csv.writer(f)
-        writer.writerow([
-            datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            result.get("download", "N/A"),
-            result.get("upload", "N/A"),
-            result.get("ping", "N/A"),
-            result.get("jitter", "N/A"),
-            result.get("latency", "N/A"),
-            score
-        ])
-
-# AI Health Score calculation
-def calculate_health_score(download, upload, ping, jitter, latency):
+        writer.writerow(_log_row(result, score, extra_fields))
+
+# Long-lived CSV logger: keeps the file open, batches rows and rotates by size/age
+class CsvLogger:
+    def __init__(self, extra_fields=(), flush_rows=1, flush_interval=0, fsync=False,
+                 rotate_bytes=0, rotate_interval=0, compress=False, timeline=False, directory="logs"):
+        self.extra_fields = extra_fields
+        self.flush_rows = max(1, flush_rows)
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.rotate_bytes = rotate_bytes
+        self.rotate_interval = rotate_interval
+        self.compress = compress
+        self.timeline = timeline
+        self.directory = directory
+        self._timeline = None
+        self.files = []
+        self._rows = []
+        self._file = None
+        self._line = io.StringIO()
+        self._line_writer = csv.writer(self._line)
+        self._open()
+
+    def _open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.filename = _new_log_filename(self.directory)
+        self.files.append(self.filename)
+        self._file = open(self.filename, "w", newline="")
+        self._index = open(self.filename + ".idx", "wb")
+        self._index.write(INDEX_MAGIC)
+        if self.timeline:
+            # Sidecar: one line per direction and iteration, samples in Mbps every interval_ms
+            self._timeline = open(self.filename + ".timeline", "w", newline="")
+            self._timeline.write("timestamp,direction,interval_ms,samples_mbps\n")
+        self.size = 0
+        self.row_count = 0
+        self.opened_at = time.monotonic()
+        self.flushed_at = self.opened_at
+        self._write([(_log_header(self.extra_fields), None)])
+
+    # rows: (csv row, epoch seconds or None for non-data rows)
+    def _write(self, rows):
+        chunks = []
+        for row, epoch in rows:
+            self._line.seek(0)
+            self._line.truncate()
+            self._line_writer.writerow(row)
+            text = self._line.getvalue()
+            if epoch is not None:
+                if self.row_count % INDEX_BLOCK_ROWS == 0:
+                    self._index.write(INDEX_ENTRY.pack(epoch, self.size))
+                self.row_count += 1
+            chunks.append(text)
+            self.size += len(text.encode())
+        self._file.write("".join(chunks))
+
+    def log(self, result, score, timestamp=None):
+        timestamp = (timestamp or datetime.now()).replace(microsecond=0)
+        self._rows.append((_log_row(result, score, self.extra_fields, timestamp), timestamp.timestamp()))
+        if self._timeline and result.get("timeline"):
+            stamp = timestamp.strftime("%Y-%m-%d %H:%M:%S")
+            for direction, samples in result["timeline"].items():
+                values = " ".join(f"{v:.1f}" for v in samples)
+                self._timeline.write(f"{stamp},{direction},{int(TIMELINE_INTERVAL * 1000)},{values}\n")
+        now = time.monotonic()
+        if len(self._rows) >= self.flush_rows or (self.flush_interval and now - self.flushed_at >= self.flush_interval):
+            self.flush()
+        if (self.rotate_bytes and self.size >= self.rotate_bytes) or \
+                (self.rotate_interval and now - self.opened_at >= self.rotate_interval):
+            self.rotate()
+
+    def flush(self):
+        if self._rows:
+            self._write(self._rows)
+            self._rows = []
+        self._file.flush()
+        self._index.flush()
+        if self._timeline:
+            self._timeline.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self.flushed_at = time.monotonic()
+
+    def rotate(self):
+        self.close()
+        if self.compress:
+            import gzip
+            import shutil
+            with open(self.filename, "rb") as src, gzip.open(self.filename + ".gz", "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(self.filename)
+            # Offsets refer to the uncompressed stream, which gzip can still seek in
+            os.replace(self.filename + ".idx", self.filename + ".gz.idx")
+            if self.timeline:
+                os.replace(self.filename + ".timeline", self.filename + ".gz.timeline")
+            self.files[-1] = self.filename + ".gz"
+        self._open()
+
+    def close(self):
+        if self._file and not self._file.closed:
+            self.flush()
+            self._file.close()
+            self._index.close()
+            if self._timeline:
+                self._timeline.close()
+
+# Load a sidecar index as parallel (epochs, offsets) lists; None when missing or invalid
+def load_log_index(path):
+    try:
+        with open(path + ".idx", "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    if not data.startswith(INDEX_MAGIC):
+        return None
+    body = memoryview(data)[len(INDEX_MAGIC):]
+    body = body[:len(body) // INDEX_ENTRY.size * INDEX_ENTRY.size]
+    entries = list(INDEX_ENTRY.iter_unpack(body))
+    return [e[0] for e in entries], [e[1] for e in entries]
+
+def _log_epoch(stamp):
+    try:
+        return datetime.strptime(stamp, "%Y-%m-%d %H:%M:%S").timestamp()
+    except ValueError:
+        return None
+
+def _open_log_binary(path):
+    if path.endswith(".gz"):
+        import gzip
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+# Build the index for a log written without one (older logs, log_to_csv)
+def build_log_index(path):
+    with _open_log_binary(path) as f, open(path + ".idx", "wb") as index:
+        index.write(INDEX_MAGIC)
+        offset = len(f.readline())
+        rows = 0
+        for line in f:
+            epoch = _log_epoch(line.split(b",", 1)[0].decode(errors="replace"))
+            if epoch is not None:
+                if rows % INDEX_BLOCK_ROWS == 0:
+                    index.write(INDEX_ENTRY.pack(epoch, offset))
+                rows += 1
+            offset += len(line)
+    return load_log_index(path)
+
+# Yield rows (dicts) with start <= timestamp < end, seeking straight to the right block
+def query_log_range(path, start, end):
+    import bisect
+
+    index = load_log_index(path)
+    if index is None and not path.endswith(".gz"):
+        try:
+            index = build_log_index(path)
+        except OSError:
+            index = None  # e.g. read-only logs directory: scan the whole file instead
+
+    with _open_log_binary(path) as f:
+        header = next(csv.reader([f.readline().decode()]))
+        if index and index[0]:
+            epochs, offsets = index
+            if epochs[0] >= end:
+                return
+            # Several blocks can start in the same second: take the last one before `start`
+            block = max(0, bisect.bisect_left(epochs, start) - 1)
+            f.seek(offsets[block])
+        for row in csv.reader(io.TextIOWrapper(f, newline="")):
+            epoch = _log_epoch(row[0]) if row else None
+            if epoch is None or epoch < start:
+                continue
+            if epoch >= end:
+                return
+            yield dict(zip(header, row))
+
+# Append-only binary result log; reopening with the same schema keeps appending
+class BinaryLogger:
+    def __init__(self, path, fields=BINLOG_FIELDS):
+        self.path = path
+        self.fields = list(fields)
+        self.record = struct.Struct("<d" + "f" * len(self.fields))
+        names = ",".join(self.fields).encode()
+        header = BINLOG_HEADER.pack(BINLOG_MAGIC, BINLOG_VERSION, len(self.fields), len(names)) + names
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, "rb") as f:
+                existing = f.read(len(header))
+            if existing != header:
+                raise ValueError(f"{path} has a different binary log schema")
+            # Drop a torn trailing record left by a crash
+            size = os.path.getsize(path)
+            complete = len(header) + (size - len(header)) // self.record.size * self.record.size
+            if complete != size:
+                os.truncate(path, complete)
+            self._file = open(path, "ab")
+        else:
+            self._file = open(path, "wb")
+            self._file.write(header)
+
+    def log(self, result, score, timestamp=None):
+        values = []
+        for field in self.fields:
+            value = score if field == "score" else result.get(field)
+            values.append(float(value) if isinstance(value, (int, float)) else math.nan)
+        self._file.write(self.record.pack(timestamp if timestamp is not None else time.time(), *values))
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+# Memory-mapped reader: columns are zero-copy NumPy views when NumPy is available,
+# otherwise arrays decoded straight from the binary records
+class BinaryLogReader:
+    def __init__(self, path):
+        import mmap
+
+        self.path = path
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count, names_len = BINLOG_HEADER.unpack_from(self._mmap, 0)
+        if magic != BINLOG_MAGIC:
+            raise ValueError(f"{path} is not a SpeedO binary log")
+        if version != BINLOG_VERSION:
+            raise ValueError(f"{path} uses binary log version {version}, expected {BINLOG_VERSION}")
+
+        offset = BINLOG_HEADER.size + names_len
+        self.fields = bytes(self._mmap[BINLOG_HEADER.size:offset]).decode().split(",")[:count]
+        record = struct.Struct("<d" + "f" * count)
+        self.rows = (len(self._mmap) - offset) // record.size
+
+        try:
+            import numpy as np
+        except ImportError:
+            np = None
+
+        if np is not None:
+            dtype = np.dtype([("timestamp", "<f8")] + [(field, "<f4") for field in self.fields])
+            data = np.frombuffer(self._mmap, dtype=dtype, count=self.rows, offset=offset)
+            self.columns = {name: data[name] for name in dtype.names}
+        else:
+            from array import array
+            self.columns = {name: array("d" if name == "timestamp" else "f") for name in ["timestamp"] + self.fields}
+            names = list(self.columns)
+            end = offset + self.rows * record.size
+            for values in record.iter_unpack(memoryview(self._mmap)[offset:end]):
+                for name, value in zip(names, values):
+                    self.columns[name].append(value)
+
+    def __len__(self):
+        return self.rows
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def close(self):
+        self.columns = {}
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass  # NumPy views still alive; the map is released with them
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# Fixed-size, mmap-backed round-robin store; every update touches one raw slot and one slot per tier
+class RoundRobinStore:
+    def __init__(self, path=RRD_DEFAULT_PATH):
+        import mmap
+
+        count = len(RRD_FIELDS)
+        self.path = path
+        self.raw = struct.Struct("<d" + "d" * count)
+        self.rollup = struct.Struct("<d" + "dddd" * count)  # bucket start + (min, mean, max, count) per field
+        self.layout = {}
+        offset = RRD_HEADER.size
+        self.layout["raw"] = (offset, RRD_RAW_SLOTS, None)
+        offset += RRD_RAW_SLOTS * self.raw.size
+        for tier, (step, slots) in RRD_TIERS.items():
+            self.layout[tier] = (offset, slots, step)
+            offset += slots * self.rollup.size
+        size = offset
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        fresh = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, "w+b" if fresh else "r+b")
+        if fresh:
+            self._file.truncate(size)
+        elif os.path.getsize(path) != size:
+            raise ValueError(f"{path} is not a SpeedO round-robin store with this layout")
+        self._mmap = mmap.mmap(self._file.fileno(), size)
+
+        if fresh:
+            RRD_HEADER.pack_into(self._mmap, 0, RRD_MAGIC, RRD_VERSION, count, RRD_RAW_SLOTS,
+                                 RRD_TIERS["minute"][1], RRD_TIERS["hour"][1], 0)
+        else:
+            magic, version = RRD_HEADER.unpack_from(self._mmap, 0)[:2]
+            if magic != RRD_MAGIC or version != RRD_VERSION:
+                raise ValueError(f"{path} is not a SpeedO round-robin store (version {RRD_VERSION})")
+
+    def update(self, result, score, timestamp=None):
+        timestamp = timestamp if timestamp is not None else time.time()
+        values = []
+        for field in RRD_FIELDS:
+            value = score if field == "score" else result.get(field)
+            values.append(float(value) if isinstance(value, (int, float)) else math.nan)
+
+        # Raw ring: cursor lives in the header
+        cursor = RRD_HEADER.unpack_from(self._mmap, 0)[-1]
+        offset, slots, _ = self.layout["raw"]
+        self.raw.pack_into(self._mmap, offset + (cursor % slots) * self.raw.size, timestamp, *values)
+        struct.pack_into("<Q", self._mmap, RRD_HEADER.size - 8, cursor + 1)
+
+        for tier in RRD_TIERS:
+            offset, slots, step = self.layout[tier]
+            start = timestamp // step * step
+            position = offset + int(timestamp // step) % slots * self.rollup.size
+            slot = list(self.rollup.unpack_from(self._mmap, position))
+            if slot[0] != start:
+                # Slot still holds an older bucket: recycle it
+                slot = [start] + [math.nan, 0.0, math.nan, 0.0] * len(RRD_FIELDS)
+            for i, value in enumerate(values):
+                if math.isnan(value):
+                    continue
+                base = 1 + i * 4
+                n = slot[base + 3] + 1
+                slot[base] = value if n == 1 else min(slot[base], value)
+                slot[base + 1] += (value - slot[base + 1]) / n
+                slot[base + 2] = value if n == 1 else max(slot[base + 2], value)
+                slot[base + 3] = n
+            self.rollup.pack_into(self._mmap, position, *slot)
+
+    # Rows within the tier's window ending at `now`, oldest first
+    # raw -> (timestamp, {field: value}); rollups -> (bucket start, {field: (min, mean, max, count)})
+    def fetch(self, tier="hour", now=None):
+        now = now if now is not None else time.time()
+        offset, slots, step = self.layout[tier]
+        rows = []
+        if tier == "raw":
+            for i in range(slots):
+                stamp, *values = self.raw.unpack_from(self._mmap, offset + i * self.raw.size)
+                if stamp and now - RRD_RAW_SPAN <= stamp <= now:
+                    rows.append((stamp, dict(zip(RRD_FIELDS, values))))
+        else:
+            for i in range(slots):
+                slot = self.rollup.unpack_from(self._mmap, offset + i * self.rollup.size)
+                if slot[0] and now - slots * step < slot[0] <= now:
+                    rows.append((slot[0], {
+                        field: tuple(slot[1 + j * 4:5 + j * 4]) for j, field in enumerate(RRD_FIELDS)
+                    }))
+        return sorted(rows, key=lambda row: row[0])
+
+    def close(self):
+        self._mmap.flush()
+        self._mmap.close()
+        self._file.close()
+
+# Constant-memory running statistics (Welford): count, mean, variance, min, max
+class RunningStats:
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        if value is None or value == "N/A":
+            return
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    # Combine with stats gathered elsewhere (Chan et al. parallel update)
+    def merge(self, other):
+        if not other.count:
+            return self
+        if not self.count:
+            self.count, self.mean, self._m2 = other.count, other.mean, other._m2
+            self.min, self.max = other.min, other.max
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self._m2 += other._m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    @property
+    def variance(self):
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def stdev(self):
+        return self.variance ** 0.5
+
+# Fixed-memory, mergeable quantile sketch (DDSketch: relative error <= SKETCH_ACCURACY)
+class QuantileSketch:
+    def __init__(self, accuracy=SKETCH_ACCURACY, max_buckets=SKETCH_MAX_BUCKETS):
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.max_buckets = max_buckets
+        self.buckets = {}
+        self.zero_count = 0
+        self.count = 0
+        self.min = None
+        self.max = None
+
+    def add(self, value, weight=1):
+        if value is None or value == "N/A":
+            return
+        self.count += weight
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        if value <= 1e-9:
+            self.zero_count += weight
+            return
+        index = math.ceil(math.log(value) / self._log_gamma)
+        self.buckets[index] = self.buckets.get(index, 0) + weight
+        if len(self.buckets) > self.max_buckets:
+            self._collapse()
+
+    # add() for a whole NumPy column at once (NaN = N/A), e.g. rescored scores
+    def add_array(self, values):
+        np = _require("numpy", "numpy")
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        low, high = float(values.min()), float(values.max())
+        self.count += len(values)
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+        positive = values[values > 1e-9]
+        self.zero_count += len(values) - len(positive)
+        indexes, counts = np.unique(np.ceil(np.log(positive) / self._log_gamma), return_counts=True)
+        for index, count in zip(indexes.astype(int).tolist(), counts.tolist()):
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        while len(self.buckets) > self.max_buckets:
+            self._collapse()
+
+    # Fold the two lowest buckets together so memory stays bounded (tails stay accurate)
+    def _collapse(self):
+        lowest, second = sorted(self.buckets)[:2]
+        self.buckets[second] += self.buckets.pop(lowest)
+
+    def merge(self, other):
+        if not other.count:
+            return self
+        self.count += other.count
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        self.zero_count += other.zero_count
+        for index, weight in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + weight
+        while len(self.buckets) > self.max_buckets:
+            self._collapse()
+        return self
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q / 100 * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return max(self.min, 0.0)
+        value = self.max
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if rank < seen:
+                value = 2 * self.gamma ** index / (self.gamma + 1)
+                break
+        # Bucket midpoints can overshoot the observed range
+        return min(max(value, self.min), self.max)
+
+def format_quantiles(sketch, unit=""):
+    return ", ".join(f"p{q:g} {sketch.quantile(q):.2f}{unit}" for q in QUANTILES)
+
+# Percentile rows for the end of a log; the timestamp cell starts with "#" so readers can skip them
+def csv_footer_rows(sketches, extra_fields=()):
+    keys = ["download", "upload", "ping", "jitter", "latency", "score"] + [key for key, _ in extra_fields]
+    rows = []
+    for q in QUANTILES:
+        row = [f"#p{q:g}"]
+        for key in keys:
+            value = sketches[key].quantile(q) if key in sketches else None
+            row.append(round(value, 2) if value is not None else "")
+        rows.append(row)
+    return rows
+
+def write_csv_footer(filename, sketches, extra_fields=()):
+    with open(filename, "a", newline="") as f:
+        csv.writer(f).writerows(csv_footer_rows(sketches, extra_fields))
+
+# AI Health Score calculation (bloat = extra RTT under load in ms, when measured)
+def calculate_health_score(download, upload, ping, jitter, latency, bloat=None, weights=HEALTH_WEIGHTS):
     if download == "N/A" or upload == "N/A" or ping == "N/A" or jitter == "N/A" or latency == "N/A":
         return 0
+    w = weights
 
-    ping_penalty = min(ping / 2, 20)
-    jitter_penalty = min(jitter / 2, 15)
-    latency_penalty = min(latency / 2, 15)
+    ping_penalty = min(ping / w["ping_ms_per_point"], w["ping_cap"])
+    jitter_penalty = min(jitter / w["jitter_ms_per_point"], w["jitter_cap"])
+    latency_penalty = min(latency / w["latency_ms_per_point"], w["latency_cap"])
+    bloat_penalty = min(max(bloat, 0) / w["bufferbloat_ms_per_point"], w["bufferbloat_cap"]) if bloat not in (None, "N/A") else 0
 
-    download_score = min((download / 100) * 30, 30)
-    upload_score = min((upload / 100) * 20, 20)
+    download_score = min((download / w["download_full_mbps"]) * w["download_points"], w["download_points"])
+    upload_score = min((upload / w["upload_full_mbps"]) * w["upload_points"], w["upload_points"])
 
-    score = 100 - ping_penalty - jitter_penalty - latency_penalty + download_score + upload_score
+    score = 100 - ping_penalty - jitter_penalty - latency_penalty - bloat_penalty + download_score + upload_score
     return max(0, min(100, round(score, 1)))
 
+# Vectorized calculate_health_score over whole columns (NumPy arrays or sequences, NaN = N/A)
+def health_scores(download, upload, ping, jitter, latency, bloat=None, weights=HEALTH_WEIGHTS):
+    np = _require("numpy", "numpy")
+    w = weights
+    download, upload, ping, jitter, latency = (np.asarray(c, dtype=np.float64) for c in (download, upload, ping, jitter, latency))
+
+    # Same operation order as the scalar scorer, so results match it exactly
+    score = (100
+             - np.minimum(ping / w["ping_ms_per_point"], w["ping_cap"])
+             - np.minimum(jitter / w["jitter_ms_per_point"], w["jitter_cap"])
+             - np.minimum(latency / w["latency_ms_per_point"], w["latency_cap"]))
+    if bloat is not None:
+        bloat = np.asarray(bloat, dtype=np.float64)
+        penalty = np.minimum(np.maximum(bloat, 0) / w["bufferbloat_ms_per_point"], w["bufferbloat_cap"])
+        score -= np.where(np.isnan(bloat), 0, penalty)
+    score += np.minimum((download / w["download_full_mbps"]) * w["download_points"], w["download_points"])
+    score += np.minimum((upload / w["upload_full_mbps"]) * w["upload_points"], w["upload_points"])
+
+    # np.round and round() can disagree on near-ties; defer to round() there so scores match the live ones
+    rounded = np.round(score, 1)
+    ties = np.flatnonzero(np.abs(score * 10 % 1 - 0.5) < 1e-6)
+    rounded[ties] = [round(x, 1) for x in score[ties].tolist()]
+    score = np.clip(rounded, 0, 100)
+    missing = np.isnan(download) | np.isnan(upload) | np.isnan(ping) | np.isnan(jitter) | np.isnan(latency)
+    return np.where(missing, 0, score)
+
+# Parse --weights: a JSON file or "key=value,key=value" overrides of HEALTH_WEIGHTS
+def parse_weights(text):
+    if not text:
+        return dict(HEALTH_WEIGHTS)
+    if os.path.exists(text):
+        with open(text) as f:
+            overrides = json.load(f)
+    else:
+        overrides = {}
+        for item in text.split(","):
+            key, _, value = item.partition("=")
+            try:
+                overrides[key.strip()] = float(value)
+            except ValueError:
+                raise argparse.ArgumentTypeError(f"invalid weight {item!r} (use key=value)")
+    unknown = sorted(set(overrides) - set(HEALTH_WEIGHTS))
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown weights: {', '.join(unknown)} (known: {', '.join(HEALTH_WEIGHTS)})")
+    return {**HEALTH_WEIGHTS, **overrides}
+
+# Health score category
+def health_status(score):
+    return (
+        "Excellent" if score >= 80 else
+        "Good" if score >= 60 else
+        "Fair" if score >= 40 else
+        "Poor" if score >= 20 else
+        "Critical"
+    )
+
 # Gradient AI Health bar
 def render_health_bar(score, width=20):
     if score >= 80:
@@ -120,25 +1063,37 @@ def render_health_bar(score, width=20):
     return f"AI Health |{color}{bar}{Style.RESET_ALL}| {score}/100"
 
 # Run speedtest-cli via subprocess
-def run_speedtest_cli():
+# (the subprocess gives no phase boundaries, so probes during it count as "loaded")
+def run_speedtest_cli(probe=None, server=None):
+    import subprocess
+
     try:
-        result = subprocess.run(
-            ["speedtest-cli", "--json"],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
-        if result.returncode != 0:
+        if probe:
+            probe.phase = "loaded"
+        with timed("spawn"):
+            process = subprocess.Popen(
+                ["speedtest-cli", "--json"] + (["--server", str(server)] if server else []),
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True
+            )
+        with timed("backend"):
+            stdout, stderr = process.communicate()
+        if probe:
+            probe.phase = "done"
+        if process.returncode != 0:
             print(Fore.RED + "Error running speedtest-cli:")
-            print(result.stderr)
+            print(stderr)
             return None
 
-        data = json.loads(result.stdout)
+        with timed("parse"):
+            data = json.loads(stdout)
         return {
             "download": round(data["download"] / 1_000_000, 2),
             "upload": round(data["upload"] / 1_000_000, 2),
             "ping": round(data["ping"], 2),
-            "latency": round(data.get("server", {}).get("latency", data["ping"]), 2)  # fallback
+            "latency": round(data.get("server", {}).get("latency", data["ping"]), 2),  # fallback
+            "bytes": data.get("bytes_sent", 0) + data.get("bytes_received", 0),
         }
 
     except FileNotFoundError:
@@ -146,18 +1101,639 @@ def run_speedtest_cli():
         print(Fore.YELLOW + "  pip install speedtest-cli")
         sys.exit(1)
 
-# Calculate jitter using ping3
-def calculate_jitter(host, samples=5, timeout=5000):
+def _speedtest_cache_file(server=None):
+    if server is None:
+        return SPEEDTEST_CACHE_FILE
+    return SPEEDTEST_CACHE_FILE.replace(".json", f"_{server}.json")
+
+# Load the persisted speedtest config/server selection if it is still fresh
+def _load_speedtest_cache(ttl, server=None):
+    try:
+        with open(_speedtest_cache_file(server)) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if time.time() - cache.get("saved", 0) > ttl:
+        return None
+    return cache
+
+def _save_speedtest_cache(config, best, server=None):
+    try:
+        os.makedirs(os.path.dirname(SPEEDTEST_CACHE_FILE), exist_ok=True)
+        with open(_speedtest_cache_file(server), "w") as f:
+            json.dump({"saved": time.time(), "config": config, "best": best}, f)
+    except OSError:
+        pass
+
+# Build (or reuse) the speedtest client, only hitting speedtest.net when the cache is stale
+def _speedtest_client(ttl, server=None):
+    state = _speedtest_state.get(server)
+    if state and time.time() < state["expires"]:
+        return state["client"]
+
+    import speedtest
+
+    cache = _load_speedtest_cache(ttl, server)
+
+    class CachedSpeedtest(speedtest.Speedtest):
+        def get_config(self):
+            if not cache:
+                return super().get_config()
+            self.config.update(json.loads(json.dumps(cache["config"])))
+            self.lat_lon = (float(self.config["client"]["lat"]), float(self.config["client"]["lon"]))
+            return self.config
+
+    client = CachedSpeedtest(secure=True)
+    if cache:
+        client._best.update(cache["best"])
+        expires = cache["saved"] + ttl
+    else:
+        config = json.loads(json.dumps(client.config))
+        client.get_servers([int(server)] if server else None)
+        _save_speedtest_cache(config, client.get_best_server(), server)
+        expires = time.time() + ttl
+
+    _speedtest_state[server] = {"client": client, "expires": expires}
+    return client
+
+# Run speedtest in-process, reusing the cached config and server selection
+def run_speedtest_lib(ttl=SPEEDTEST_CACHE_TTL, probe=None, server=None):
+    try:
+        import speedtest
+    except ImportError:
+        print(Fore.RED + "speedtest module not installed. Install with:")
+        print(Fore.YELLOW + "  pip install speedtest-cli")
+        sys.exit(1)
+
+    try:
+        client = _speedtest_client(ttl, server)
+        client.results = speedtest.SpeedtestResults(
+            client=client.config["client"], opener=client._opener, secure=client._secure
+        )
+        # Re-ping only the chosen server instead of re-running full selection
+        best = client.get_best_server([dict(client.best)])
+        if best["latency"] >= 1_800_000:  # every latency probe failed
+            raise speedtest.SpeedtestBestServerFailure(f"cached server {best.get('id')} is unreachable")
+        if probe:
+            probe.phase = "download"
+        client.download()
+        if probe:
+            probe.phase = "upload"
+        client.upload()
+        if probe:
+            probe.phase = "done"
+    except speedtest.SpeedtestException as e:
+        # Drop both cache layers so the next iteration re-selects a server
+        _speedtest_state.pop(server, None)
+        try:
+            os.remove(_speedtest_cache_file(server))
+        except OSError:
+            pass
+        print(Fore.RED + f"Error running speedtest: {e}")
+        return None
+
+    return {
+        "download": round(client.results.download / 1_000_000, 2),
+        "upload": round(client.results.upload / 1_000_000, 2),
+        "ping": round(client.results.ping, 2),
+        "latency": round(best.get("latency", client.results.ping), 2),
+        "bytes": client.results.bytes_sent + client.results.bytes_received,
+    }
+
+# Shared byte counter for all streams of one transfer direction
+class _Transfer:
+    def __init__(self):
+        self.bytes = 0
+        self.connect_times = []
+        self.errors = []
+        self.elapsed = 0
+        self.stopped = False  # set when --adaptive ends the transfer before the deadline
+
+# Reads an HTTP response into a reusable buffer, counting body bytes only
+# (built on first use so that importing SpeedO does not load asyncio)
+@functools.lru_cache(maxsize=None)
+def _sink_protocol():
+    class _SinkProtocol(asyncio.BufferedProtocol):
+        def __init__(self, request, buffer, transfer):
+            self.request = request
+            self.buffer = buffer
+            self.transfer = transfer
+            self.header = b""
+            self.in_body = False
+            self.closing = False  # we closed it (deadline reached)
+            self.done = asyncio.get_running_loop().create_future()
+
+        def connection_made(self, transport):
+            self.transport = transport
+            transport.write(self.request)
+
+        def get_buffer(self, sizehint):
+            return self.buffer
+
+        def buffer_updated(self, nbytes):
+            if self.in_body:
+                self.transfer.bytes += nbytes
+                return
+            self.header += self.buffer[:nbytes]
+            end = self.header.find(b"\r\n\r\n")
+            if end < 0:
+                return
+            status = self.header.split(b"\r\n", 1)[0].split()
+            if len(status) < 2 or status[1] != b"200":
+                self.transfer.errors.append(self.header.split(b"\r\n", 1)[0].decode(errors="replace"))
+                self.in_body = None  # failed, already reported
+                self.transport.close()
+                return
+            self.in_body = True
+            self.transfer.bytes += len(self.header) - end - 4
+
+        def eof_received(self):
+            return False
+
+        def connection_lost(self, exc):
+            # Closed before a response header: not an HTTP speedo server (wrong port, https over
+            # http://, a proxy); fail the direction rather than reconnect in a tight loop
+            if self.in_body is False and not self.closing and not self.transfer.stopped:
+                self.transfer.errors.append(f"connection closed before response{f': {exc}' if exc else ''}")
+            if not self.done.done():
+                self.done.set_result(exc)
+
+    return _SinkProtocol
+
+def _parse_endpoint(endpoint):
+    from urllib.parse import urlsplit
+
+    parts = urlsplit(endpoint if "://" in endpoint else "http://" + endpoint)
+    secure = parts.scheme == "https"
+    port = parts.port or (443 if secure else 80)
+    ssl_ctx = ssl.create_default_context() if secure else None
+    return parts.hostname, port, ssl_ctx, parts.path.rstrip("/")
+
+def _host_header(host, port, ssl_ctx):
+    default = 443 if ssl_ctx else 80
+    return host if port == default else f"{host}:{port}"
+
+# One download stream: keeps re-requesting until the deadline
+async def _download_stream(endpoint, transfer, deadline):
+    host, port, ssl_ctx, base = _parse_endpoint(endpoint)
+    loop = asyncio.get_running_loop()
+    request = (
+        f"GET {base}{NATIVE_DOWNLOAD_PATH} HTTP/1.1\r\n"
+        f"Host: {_host_header(host, port, ssl_ctx)}\r\n"
+        "User-Agent: SpeedO\r\nConnection: close\r\n\r\n"
+    ).encode()
+    buffer = bytearray(NATIVE_BUFFER_SIZE)
+    protocol_class = _sink_protocol()
+
+    while loop.time() < deadline and not transfer.errors and not transfer.stopped:
+        started = loop.time()
+        try:
+            transport, protocol = await asyncio.wait_for(loop.create_connection(
+                lambda: protocol_class(request, memoryview(buffer), transfer), host, port, ssl=ssl_ctx
+            ), max(0, min(NATIVE_CONNECT_TIMEOUT, deadline - loop.time())))
+        except asyncio.TimeoutError:
+            transfer.errors.append(f"connect to {host}:{port} timed out")
+            return
+        transfer.connect_times.append((loop.time() - started) * 1000)
+        try:
+            await asyncio.wait_for(protocol.done, max(0, deadline - loop.time()))
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            protocol.closing = True
+            transport.close()
+
+# One upload stream: POSTs the same payload buffer over and over until the deadline
+async def _upload_stream(endpoint, transfer, deadline, payload):
+    host, port, ssl_ctx, base = _parse_endpoint(endpoint)
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port, ssl=ssl_ctx),
+                                                max(0, min(NATIVE_CONNECT_TIMEOUT, deadline - loop.time())))
+    except asyncio.TimeoutError:
+        transfer.errors.append(f"connect to {host}:{port} timed out")
+        return
+    transfer.connect_times.append((loop.time() - started) * 1000)
+    writer.write((
+        f"POST {base}{NATIVE_UPLOAD_PATH} HTTP/1.1\r\n"
+        f"Host: {_host_header(host, port, ssl_ctx)}\r\n"
+        "User-Agent: SpeedO\r\nContent-Type: application/octet-stream\r\n"
+        f"Content-Length: {NATIVE_UPLOAD_BYTES}\r\nConnection: close\r\n\r\n"
+    ).encode())
+    try:
+        while loop.time() < deadline and not transfer.stopped:
+            # A speedo server only answers once the body is complete, so EOF now means it hung up
+            if reader.at_eof():
+                raise ConnectionError("connection closed before response")
+            writer.write(payload)
+            await asyncio.wait_for(writer.drain(), max(0, deadline - loop.time()))
+            transfer.bytes += len(payload)
+    except asyncio.TimeoutError:
+        pass
+    except ConnectionError as e:
+        if not transfer.stopped:
+            transfer.errors.append(str(e))
+    finally:
+        writer.close()
+
+# Sample the shared byte counter every TIMELINE_INTERVAL (Mbps per slice) until cancelled,
+# or until `until(samples)` says the measurement has converged
+async def _sample_timeline(direction, transfer, samples, on_sample=None, until=None):
+    loop = asyncio.get_running_loop()
+    last_time, last_bytes = loop.time(), 0
+    while True:
+        await asyncio.sleep(TIMELINE_INTERVAL)
+        now, total = loop.time(), transfer.bytes
+        mbps = (total - last_bytes) * 8 / (now - last_time) / 1_000_000
+        samples.append(mbps)
+        last_time, last_bytes = now, total
+        if on_sample:
+            on_sample(direction, mbps)
+        if until and until(samples):
+            return
+
+# True once the last ADAPTIVE_WINDOW rolling estimates agree within +/- band percent
+def converged(samples, band=ADAPTIVE_BAND, window=ADAPTIVE_WINDOW):
+    if len(samples) < 2 * window - 1:
+        return False
+    estimates = [statistics.fmean(samples[i - window:i]) for i in range(len(samples) - window + 1, len(samples) + 1)]
+    center = statistics.fmean(estimates)
+    return center > 0 and max(abs(e - center) for e in estimates) <= center * band / 100
+
+# Run N parallel streams in one direction and return (Mbps, transfer, timeline samples);
+# with `adaptive` (band percent) the streams are cancelled as soon as the estimate converges
+async def _measure_direction(direction, endpoint, streams, duration, on_sample=None, adaptive=None,
+                             min_duration=ADAPTIVE_MIN_DURATION):
+    loop = asyncio.get_running_loop()
+    transfer = _Transfer()
+    samples = array("f")
+    started = loop.time()
+    deadline = started + duration
+    until = None
+    if adaptive:
+        min_slices = round(min_duration / TIMELINE_INTERVAL)
+        until = lambda samples: len(samples) >= min_slices and converged(samples, adaptive)
+    sampler = asyncio.ensure_future(_sample_timeline(direction, transfer, samples, on_sample, until))
+
+    if direction == "download":
+        tasks = [_download_stream(endpoint, transfer, deadline) for _ in range(streams)]
+    else:
+        payload = memoryview(os.urandom(NATIVE_BUFFER_SIZE))
+        tasks = [_upload_stream(endpoint, transfer, deadline, payload) for _ in range(streams)]
+    tasks = [asyncio.ensure_future(task) for task in tasks]
+
+    streams_done = asyncio.gather(*tasks, return_exceptions=True)
+    await asyncio.wait([streams_done, sampler], return_when=asyncio.FIRST_COMPLETED)
+    if not streams_done.done():
+        # Converged early: cancelling closes every stream's connection (CancelledError is not an
+        # error); the flag covers a cancel that wait_for() drops when drain() completes at once
+        transfer.stopped = True
+        for task in tasks:
+            task.cancel()
+    results = await streams_done
+    elapsed = loop.time() - started
+    sampler.cancel()
+    transfer.errors.extend(str(r) for r in results if isinstance(r, Exception))
+    mbps = round(transfer.bytes * 8 / elapsed / 1_000_000, 2) if elapsed > 0 else 0
+    transfer.elapsed = elapsed
+    return mbps, transfer, samples
+
+# Post-ramp throughput: skip slices until one reaches TIMELINE_RAMP_FRACTION of the median
+# of the second half (slow start, shaping bursts), then average the rest. Returns (Mbps, ramp ms).
+def steady_state(samples, interval=TIMELINE_INTERVAL):
+    if len(samples) < 4:
+        return None, None
+    tail = sorted(samples[len(samples) // 2:])
+    target = tail[len(tail) // 2] * TIMELINE_RAMP_FRACTION
+    start = next(i for i, value in enumerate(samples) if value >= target)
+    return round(statistics.fmean(samples[start:]), 2), round(start * interval * 1000)
+
+# Ping-only runs: time a few bare TCP connects (like a tcp:// probe) instead of loading the link
+async def _connect_times(endpoint, count=NATIVE_PING_CONNECTS, timeout=NATIVE_CONNECT_TIMEOUT):
+    host, port, _, _ = _parse_endpoint(endpoint)
+    loop = asyncio.get_running_loop()
+    times = []
+    for _ in range(count):
+        started = loop.time()
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+        except asyncio.TimeoutError:
+            raise ConnectionError(f"connect to {host}:{port} timed out")
+        times.append((loop.time() - started) * 1000)
+        writer.close()
+    return times
+
+async def _native_test(endpoint, test_type, streams, duration, probe=None, on_sample=None, adaptive=None,
+                       min_duration=ADAPTIVE_MIN_DURATION):
+    result = {"bytes": 0}
+    connect_times = []
+
+    if test_type == "P":
+        with timed(None, "connect", {"endpoint": endpoint, "connects": NATIVE_PING_CONNECTS}):
+            connect_times = await _connect_times(endpoint)
+
+    for direction, key in (("download", "D"), ("upload", "U")):
+        if test_type not in ["ALL", key]:
+            continue
+        if probe:
+            probe.phase = direction
+        with timed(None, direction, {"endpoint": endpoint, "streams": streams}) as span:
+            mbps, transfer, samples = await _measure_direction(
+                direction, endpoint, streams, duration, on_sample, adaptive, min_duration
+            )
+            span.args.update(mbps=mbps, bytes=transfer.bytes, connections=len(transfer.connect_times),
+                             seconds=round(transfer.elapsed, 2))
+        if transfer.errors and not transfer.bytes:
+            raise ConnectionError(f"{direction} failed: {transfer.errors[0]}")
+        result[direction] = mbps
+        result["bytes"] += transfer.bytes
+        connect_times.extend(transfer.connect_times)
+        result.setdefault("timeline", {})[direction] = samples
+        result[f"{direction}_steady"], result[f"{direction}_ramp"] = steady_state(samples)
+        result[f"{direction}_duration"] = round(transfer.elapsed, 2)
+
+    if probe:
+        probe.phase = "done"
+    if connect_times:
+        result["ping"] = round(min(connect_times), 2)
+        result["latency"] = round(statistics.median(connect_times), 2)
+    return result
+
+# Built-in asyncio multi-stream HTTP engine (alternative to speedtest-cli)
+def run_native_test(endpoint, test_type="ALL", streams=NATIVE_STREAMS, duration=NATIVE_DURATION, echo_port=None, probe=None,
+                    on_sample=None, adaptive=None, min_duration=ADAPTIVE_MIN_DURATION):
+    try:
+        data = asyncio.run(_native_test(endpoint, test_type, streams, duration, probe, on_sample, adaptive, min_duration))
+    except (OSError, ConnectionError) as e:
+        print(Fore.RED + f"Error running native engine against {endpoint}:")
+        print(str(e))
+        return None
+
+    result = {
+        "download": data.get("download", "N/A"),
+        "upload": data.get("upload", "N/A"),
+        "ping": data.get("ping", "N/A"),
+        "latency": data.get("latency", "N/A"),
+        "bytes": data["bytes"],
+    }
+    result.update((key, data[key]) for key in TIMELINE_KEYS if data.get(key) is not None)
+    return result
+
+# Dispatch to the selected measurement backend
+# (only the native engine sees inside a transfer, so on_sample is ignored by the others)
+def run_backend(test_type="ALL", engine="cli", engine_options=None, probe=None, on_sample=None):
+    if engine == "native":
+        with timed("backend"):
+            return run_native_test(test_type=test_type, probe=probe, on_sample=on_sample, **(engine_options or {}))
+    if engine == "speedtest":
+        with timed("backend"):
+            return run_speedtest_lib(probe=probe, **(engine_options or {}))
+    return run_speedtest_cli(probe, **(engine_options or {}))
+
+# Measure several servers/endpoints in one iteration
+#   concurrent - all at once through a thread pool (path independence; throughput adds up)
+#   staggered  - one after another (each sees the local link alone; throughput is averaged)
+def run_fanout(targets, test_type="ALL", engine="cli", engine_options=None, mode="staggered", probe=None):
+    def measure(target):
+        options = dict(engine_options or {})
+        options["endpoint" if engine == "native" else "server"] = target
+        return run_backend(test_type, engine, options)
+
+    # Probes see one combined load, so phases are not split per server
+    if probe:
+        probe.phase = "loaded"
+    if mode == "concurrent":
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=len(targets)) as pool:
+            results = list(pool.map(measure, targets))
+    else:
+        results = [measure(target) for target in targets]
+    if probe:
+        probe.phase = "done"
+
+    servers = dict(zip(targets, results))
+    ok = [r for r in results if r]
+    if not ok:
+        return None
+
+    aggregate = {"servers": servers}
+    for key in ("download", "upload"):
+        values = [r[key] for r in ok if isinstance(r.get(key), (int, float))]
+        if values:
+            total = sum(values) if mode == "concurrent" else statistics.mean(values)
+            aggregate[key] = round(total, 2)
+    pings = [r["ping"] for r in ok if isinstance(r.get("ping"), (int, float))]
+    latencies = [r["latency"] for r in ok if isinstance(r.get("latency"), (int, float))]
+    if pings:
+        aggregate["ping"] = round(min(pings), 2)
+    if latencies:
+        aggregate["latency"] = round(statistics.mean(latencies), 2)
+    aggregate["bytes"] = sum(r.get("bytes", 0) for r in ok)
+    return aggregate
+
+# Single UDP round trip against a `speedo serve` echo port (seconds, like ping3)
+def echo_ping(host, port, timeout=5):
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.settimeout(timeout)
+        payload = os.urandom(16)
+        try:
+            start = time.perf_counter()
+            sock.sendto(payload, (host, port))
+            while True:
+                data, _ = sock.recvfrom(64)
+                if data == payload:
+                    return time.perf_counter() - start
+        except OSError:
+            return None
+
+# Calculate jitter using ping3 (or the UDP echo of a speedo server)
+def calculate_jitter(host, samples=5, timeout=5000, echo_port=None):
     pings = []
-    for _ in range(samples):
-        res = ping(host, timeout=timeout/1000)  # ms to sec
+    for i in range(samples):
+        with timed("ping", f"ping[{i}]"):
+            if echo_port:
+                res = echo_ping(host, echo_port, timeout=timeout/1000)
+            else:
+                res = _ping(host, timeout/1000)  # ms to sec
         if res:
             pings.append(res * 1000)
-        time.sleep(0.2)
+        with timed("sleep"):
+            time.sleep(0.2)
     if len(pings) > 1:
         return round(statistics.stdev(pings), 2)
     return 0
 
+# One probe of a target: host (ICMP via ping3), tcp://host:port (connect time) or udp://host:port (speedo echo)
+async def _probe_once(target, timeout, executor):
+    loop = asyncio.get_running_loop()
+    scheme, _, address = target.rpartition("://")
+    if scheme == "tcp":
+        host, _, port = address.rpartition(":")
+        started = loop.time()
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(host, int(port)), timeout)
+        except (OSError, asyncio.TimeoutError):
+            return None
+        rtt = loop.time() - started
+        writer.close()
+        return rtt
+    if scheme == "udp":
+        host, _, port = address.rpartition(":")
+        return await loop.run_in_executor(executor, echo_ping, host, int(port), timeout)
+    return await loop.run_in_executor(executor, lambda: _ping(address, timeout))
+
+# Fire `samples` probes at a fixed rate; slow replies never delay the next send
+async def _probe_host(target, samples, interval, timeout, executor):
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    tasks = []
+    for i in range(samples):
+        await asyncio.sleep(max(0, start + i * interval - loop.time()))
+        tasks.append(asyncio.ensure_future(_probe_once(target, timeout, executor)))
+    rtts = [r * 1000 for r in await asyncio.gather(*tasks) if r]
+
+    stats = {"sent": samples, "received": len(rtts), "loss": round((1 - len(rtts) / samples) * 100, 1) if samples else 0}
+    if rtts:
+        stats.update(
+            min=round(min(rtts), 2),
+            avg=round(statistics.mean(rtts), 2),
+            max=round(max(rtts), 2),
+            jitter=round(statistics.stdev(rtts), 2) if len(rtts) > 1 else 0,
+        )
+    return stats
+
+async def _probe_hosts(hosts, samples, interval, timeout):
+    from concurrent.futures import ThreadPoolExecutor
+
+    # Enough threads for every probe that can be in flight at once
+    in_flight = len(hosts) * (int(timeout / interval) + 1) if interval > 0 else len(hosts) * samples
+    with ThreadPoolExecutor(max_workers=max(1, min(PROBE_MAX_WORKERS, in_flight))) as executor:
+        results = await asyncio.gather(*[_probe_host(h, samples, interval, timeout, executor) for h in hosts])
+    return dict(zip(hosts, results))
+
+# Probe many hosts concurrently; wall time ~ samples * interval regardless of host count
+def probe_hosts(hosts, samples=5, interval=PROBE_INTERVAL, timeout=1.0):
+    return asyncio.run(_probe_hosts(list(hosts), samples, interval, timeout))
+
+# Read probe targets from a comma-separated list and/or a file (one per line, # comments)
+def load_hosts(hosts=None, hosts_file=None):
+    targets = [h.strip() for h in (hosts or "").split(",") if h.strip()]
+    if hosts_file:
+        with open(hosts_file) as f:
+            for line in f:
+                line = line.split("#", 1)[0].strip()
+                if line:
+                    targets.append(line)
+    return list(dict.fromkeys(targets))
+
+# Background RTT prober; backends switch `phase` as they move between transfers
+class LatencyProbe:
+    def __init__(self, host, echo_port=None, interval=BUFFERBLOAT_INTERVAL, timeout=1.0):
+        self.host = host
+        self.echo_port = echo_port
+        self.interval = interval
+        self.timeout = timeout
+        self.phase = "idle"
+        self.samples = {}
+        self.lost = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            started = time.perf_counter()
+            phase = self.phase
+            if self.echo_port:
+                rtt = echo_ping(self.host, self.echo_port, timeout=self.timeout)
+            else:
+                rtt = _ping(self.host, self.timeout)
+            if rtt:
+                self.samples.setdefault(phase, []).append(rtt * 1000)
+            else:
+                self.lost[phase] = self.lost.get(phase, 0) + 1
+            self._stop.wait(max(0, self.interval - (time.perf_counter() - started)))
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+# Nearest-rank percentile of a list of samples
+def _percentile(values, q):
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+def bufferbloat_grade(added_ms):
+    for limit, grade in BUFFERBLOAT_GRADES:
+        if added_ms < limit:
+            return grade
+    return "F"
+
+# Idle vs loaded RTT distributions plus the added latency and its grade
+def summarize_bufferbloat(probe):
+    rtt = {}
+    for phase, values in probe.samples.items():
+        if phase == "done" or not values:
+            continue
+        rtt[phase] = {
+            "p50": round(_percentile(values, 50), 2),
+            "p90": round(_percentile(values, 90), 2),
+            "max": round(max(values), 2),
+            "samples": len(values),
+            "lost": probe.lost.get(phase, 0),
+        }
+
+    summary = {"rtt": rtt}
+    loaded = [p for p in ("download", "upload", "loaded") if p in rtt]
+    if "idle" in rtt:
+        summary["idle_latency"] = rtt["idle"]["p50"]
+    if loaded:
+        summary["loaded_latency"] = max(rtt[p]["p50"] for p in loaded)
+    if "idle" in rtt and loaded:
+        summary["bufferbloat"] = round(max(0, summary["loaded_latency"] - summary["idle_latency"]), 2)
+        summary["bufferbloat_grade"] = bufferbloat_grade(summary["bufferbloat"])
+    return summary
+
+# Host (and optional echo port) used for jitter/latency probes
+def _latency_target(engine, engine_options):
+    options = engine_options or {}
+    if engine == "native" and options.get("echo_port"):
+        return _parse_endpoint(options["endpoint"])[0], options["echo_port"]
+    return "8.8.8.8", None
+
+# One-line idle vs loaded RTT summary
+def render_bufferbloat(result):
+    if "bufferbloat" not in result:
+        return "Bloat: N/A"
+    rtt = result.get("rtt", {})  # replayed rows only carry the logged summary columns
+    parts = [f"Idle p50 {result.get('idle_latency', 'N/A')} ms"] + [
+        f"{phase} p50 {rtt[phase]['p50']} / p90 {rtt[phase]['p90']} ms"
+        for phase in ("download", "upload", "loaded") if phase in rtt
+    ]
+    return " | ".join(parts) + f" | Bloat +{result['bufferbloat']} ms ({result['bufferbloat_grade']})"
+
+# Post-ramp throughput from the timeline, e.g. "Steady DL 912.4 Mbps (ramp 300 ms)"
+def render_steady(result):
+    parts = []
+    for direction, label in (("download", "DL"), ("upload", "UL")):
+        if result.get(f"{direction}_steady") is not None:
+            parts.append(f"{label} {result[f'{direction}_steady']} Mbps (ramp {result[f'{direction}_ramp']} ms)")
+    return "Steady " + " | ".join(parts) if parts else "Steady N/A"
+
+# One-line per-server download/upload summary for fan-out runs
+def render_servers(result):
+    parts = []
+    for target, r in result.get("servers", {}).items():
+        if r:
+            parts.append(f"{target}: {r.get('download', 'N/A')}/{r.get('upload', 'N/A')} Mbps")
+        else:
+            parts.append(f"{target}: failed")
+    return "Servers: " + " | ".join(parts) if parts else "Servers: N/A"
+
 # ASCII bar renderer
 def render_ascii_bar(label, value, max_value, width=20):
     if value == "N/A" or max_value == 0:
@@ -169,15 +1745,40 @@ def render_ascii_bar(label, value, max_value, width=20):
     return f"{label:<9} |{bar}| {value}"
 
 # Combined test (Download, Upload, Ping, Jitter, Latency)
-def run_speed_test(test_type="ALL", ping_samples=5, timeout=5000):
+def run_speed_test(test_type="ALL", ping_samples=5, timeout=5000, engine="cli", engine_options=None, bufferbloat=False,
+                   hosts=None, probe_interval=PROBE_INTERVAL, servers=None, fanout="staggered", on_sample=None):
     result = {}
+    host, echo_port = _latency_target(engine, engine_options)
 
-    # Run speedtest-cli for download/upload/ping/latency
+    # Run the measurement backend for download/upload/ping/latency
     if test_type in ["ALL", "D", "U", "P"]:
-        cli_result = run_speedtest_cli()
+        probe = None
+        if bufferbloat and test_type != "P":
+            # Sample the idle link first, then keep probing through the transfers
+            probe = LatencyProbe(host, echo_port, timeout=timeout/1000)
+            probe.start()
+            with timed("sleep"):
+                time.sleep(BUFFERBLOAT_IDLE_SECONDS)
+        try:
+            with timed(None, "speedtest", {"engine": engine, "test": test_type}):
+                if servers:
+                    cli_result = run_fanout(servers, test_type, engine, engine_options, fanout, probe)
+                else:
+                    cli_result = run_backend(test_type, engine, engine_options, probe, on_sample)
+        finally:
+            if probe:
+                probe.stop()
         if not cli_result:
+            result["failed"] = True
             return result
 
+        if probe:
+            result.update(summarize_bufferbloat(probe))
+        if "servers" in cli_result:
+            result["servers"] = cli_result["servers"]
+        result["bytes"] = cli_result.get("bytes", 0)
+        result.update((key, cli_result[key]) for key in TIMELINE_KEYS if key in cli_result)
+
         if test_type in ["ALL", "D"]:
             result["download"] = cli_result["download"]
         if test_type in ["ALL", "U"]:
@@ -186,35 +1787,227 @@ def run_speed_test(test_type="ALL", ping_samples=5, timeout=5000):
             result["ping"] = cli_result["ping"]
             result["latency"] = cli_result["latency"]
 
-    # Add jitter calculation
-    if test_type in ["ALL", "P"]:
-        jitter = calculate_jitter("8.8.8.8", samples=ping_samples, timeout=timeout)
+    # Add jitter calculation (against our own server when it exposes an echo port)
+    if test_type in ["ALL", "P"] and hosts:
+        # Concurrent multi-host probing; overall jitter is the mean across responding hosts
+        with timed("ping", "probe_hosts", {"hosts": len(hosts), "samples": ping_samples}):
+            result["probes"] = probe_hosts(hosts, samples=ping_samples, interval=probe_interval, timeout=timeout/1000)
+        jitters = [p["jitter"] for p in result["probes"].values() if "jitter" in p]
+        result["jitter"] = round(statistics.mean(jitters), 2) if jitters else 0
+    elif test_type in ["ALL", "P"]:
+        with timed(None, "jitter", {"host": host, "samples": ping_samples}) as span:
+            jitter = calculate_jitter(host, samples=ping_samples, timeout=timeout, echo_port=echo_port)
+            span.args["jitter_ms"] = jitter
         result["jitter"] = jitter
 
     return result
 
+# Drift-free scheduler: iterations aim at start + k * interval on the monotonic clock
+#   skip      - drop missed deadlines and wait for the next one on the grid
+#   immediate - run late iterations back to back until caught up with the grid
+#   coalesce  - run once now for all missed deadlines, then rejoin the grid
+class IterationScheduler:
+    def __init__(self, interval, duration, overrun="skip"):
+        if overrun not in OVERRUN_POLICIES:
+            raise ValueError(f"unknown overrun policy {overrun!r}")
+        self.interval = interval
+        self.overrun = overrun
+        self.start = time.monotonic()
+        self.end = self.start + duration
+        self.deadline = self.start
+        self.skipped = 0
+        self.coalesced = 0
+        self.overruns = 0
+
+    def _next_grid_point(self, now):
+        return self.start + (math.floor((now - self.start) / self.interval) + 1) * self.interval
+
+    # Sleep until the next iteration is due; returns its lag in seconds, or None when the run is over
+    def wait(self):
+        now = time.monotonic()
+        if now - self.deadline > self.interval * SCHEDULE_TOLERANCE:
+            self.overruns += 1
+            missed = int((now - self.deadline) // self.interval)
+            if self.overrun == "skip":
+                self.skipped += missed + 1
+                self.deadline = self._next_grid_point(now)
+            elif self.overrun == "coalesce":
+                self.coalesced += missed
+
+        if self.deadline >= self.end:
+            return None
+        if now < self.deadline:
+            time.sleep(self.deadline - now)
+        lag = max(0.0, time.monotonic() - self.deadline)
+
+        if self.overrun == "coalesce" and lag > self.interval * SCHEDULE_TOLERANCE:
+            self.deadline = self._next_grid_point(time.monotonic())
+        else:
+            self.deadline += self.interval
+        return lag
+
+# Serves /metrics from text rendered once per iteration; scrapes never touch the stats
+class MetricsExporter:
+    def __init__(self, port, host=METRICS_HOST):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = exporter.body
+                self.send_response(200)
+                self.send_header("Content-Type", "application/openmetrics-text; version=1.0.0; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.iterations = 0
+        self.failures = 0
+        self.bytes = 0
+        self.last = {}
+        self.histograms = {key: [0] * (len(bounds) + 1) for key, _, _, bounds in METRICS_SERIES}
+        self.sums = {key: 0.0 for key, _, _, _ in METRICS_SERIES}
+        self.body = self.render()
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def update(self, result, score, timestamp=None):
+        self.iterations += 1
+        self.failures += bool(result.get("failed"))
+        self.bytes += result.get("bytes", 0)
+        for key, _, _, bounds in METRICS_SERIES:
+            value = score if key == "score" else result.get(key)
+            if not isinstance(value, (int, float)):
+                continue
+            self.last[key] = value
+            self.sums[key] += value
+            counts = self.histograms[key]
+            for i, bound in enumerate(bounds):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+        self.last_update = timestamp if timestamp is not None else time.time()
+        # Swapping one bytes object is atomic, so handlers never see a half-built page
+        self.body = self.render()
+
+    def render(self):
+        lines = []
+        for key, name, help_text, bounds in METRICS_SERIES:
+            if key in self.last:
+                lines += [f"# TYPE speedo_last_{name} gauge", f"# HELP speedo_last_{name} {help_text}, latest iteration",
+                          f"speedo_last_{name} {self.last[key]}"]
+        for key, name, help_text, bounds in METRICS_SERIES:
+            lines += [f"# TYPE speedo_{name} histogram", f"# HELP speedo_{name} {help_text}"]
+            cumulative = 0
+            for bound, count in zip(bounds + ["+Inf"], self.histograms[key]):
+                cumulative += count
+                lines.append(f'speedo_{name}_bucket{{le="{bound}"}} {cumulative}')
+            lines += [f"speedo_{name}_count {cumulative}", f"speedo_{name}_sum {round(self.sums[key], 3)}"]
+        lines += [
+            "# TYPE speedo_iterations counter", "# HELP speedo_iterations Completed test iterations",
+            f"speedo_iterations_total {self.iterations}",
+            "# TYPE speedo_failures counter", "# HELP speedo_failures Iterations where the backend failed",
+            f"speedo_failures_total {self.failures}",
+            "# TYPE speedo_transferred_bytes counter", "# HELP speedo_transferred_bytes Bytes moved by throughput tests",
+            f"speedo_transferred_bytes_total {self.bytes}",
+        ]
+        if self.iterations:
+            lines += ["# TYPE speedo_last_iteration_timestamp_seconds gauge",
+                      f"speedo_last_iteration_timestamp_seconds {round(self.last_update, 3)}"]
+        return ("\n".join(lines) + "\n# EOF\n").encode()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
 # Stress test loop with live ASCII + logging + AI Health Score
-def stress_test(duration, test_type="ALL", ping_samples=5, timeout=5000):
-    print(Fore.YELLOW + f"Starting stress test for {duration} seconds...")
-    end_time = time.time() + duration
+def stress_test(duration, test_type="ALL", ping_samples=5, timeout=5000, engine="cli", engine_options=None, bufferbloat=False,
+                hosts=None, probe_interval=PROBE_INTERVAL, log_options=None, binlog=None, rrd=None,
+                interval=None, overrun="skip", servers=None, fanout="staggered", collector=None, agent_id=None,
+                metrics_port=None, metrics_host=METRICS_HOST, headless=False, max_fps=LIVE_MAX_FPS, profile=False,
+                replay=None, speed=0, weights=HEALTH_WEIGHTS):
+    if replay is None:
+        print(Fore.YELLOW + f"Starting stress test for {duration} seconds...")
+    end_time = time.time() + (duration or 0)
     iteration = 1
+    scheduler = IterationScheduler(interval, duration, overrun) if interval else None
+    lags = RunningStats()
 
-    # Track stats
-    downloads, uploads, pings, jitters, latencies = [], [], [], [], []
+    # Track stats in O(1) memory, however long the run
+    stats = {key: RunningStats() for key in STAT_KEYS}
+    sketches = {key: QuantileSketch() for key in STAT_KEYS + ["score"]}
+    steady = {key: RunningStats() for key in ("download_steady", "upload_steady", "download_ramp", "upload_ramp")}
+    adaptive = bool((engine_options or {}).get("adaptive"))
+    durations = {key: RunningStats() for key, _ in ADAPTIVE_FIELDS + [("bytes", None)]}
 
     # Init CSV log
-    log_file = init_log_file()
+    timeline = bool((log_options or {}).get("timeline"))
+    extra_fields = (BUFFERBLOAT_FIELDS if bufferbloat else []) + (SCHEDULE_FIELDS if scheduler else []) + \
+        (TIMELINE_FIELDS if timeline else []) + (ADAPTIVE_FIELDS if adaptive else []) + (PHASE_FIELDS if profile else [])
+    phases = None
+    if profile:
+        enable_phases()
+        phases = PhaseProfile()
+    # Bind the metrics endpoint and open the binary log and round-robin store first, so a busy
+    # port or layout mismatch exits before an empty CSV log is created
+    metrics = None
+    if metrics_port:
+        try:
+            metrics = MetricsExporter(metrics_port, metrics_host)
+        except OSError as e:
+            print(Fore.RED + f"Could not serve metrics on {metrics_host}:{metrics_port}: {e}")
+            sys.exit(1)
+        print(Fore.MAGENTA + f"Metrics: http://{metrics_host}:{metrics_port}/metrics")
+    binary_logger = None
+    if binlog:
+        fields = BINLOG_FIELDS + (["idle_latency", "loaded_latency", "bufferbloat"] if bufferbloat else [])
+        try:
+            binary_logger = BinaryLogger(binlog, fields)
+        except (OSError, ValueError) as e:
+            print(Fore.RED + f"Could not open binary log {binlog}: {e}")
+            sys.exit(1)
+    store = None
+    if rrd:
+        try:
+            store = RoundRobinStore(rrd)
+        except (OSError, ValueError) as e:
+            print(Fore.RED + f"Could not open round-robin store {rrd}: {e}")
+            sys.exit(1)
+    logger = CsvLogger(extra_fields, **(log_options or {}))
+    agent = AgentClient(collector, agent_id) if collector else None
 
-    print(Fore.LIGHTBLUE_EX + BANNER)
+    view = None
+    frame = []
+    if not headless:
+        print(Fore.LIGHTBLUE_EX + BANNER)
+        view = LiveView(max_fps)
 
-    while time.time() < end_time:
-        result = run_speed_test(test_type, ping_samples, timeout)
+    # Live speedometer under the previous iteration's frame while a transfer runs (native engine)
+    def on_sample(direction, mbps):
+        scale = max(stats[direction].max or 0, mbps) or 100
+        view.update(frame + [Fore.MAGENTA + render_ascii_bar("Live " + ("DL" if direction == "download" else "UL"), round(mbps, 2), scale)])
 
-        if "download" in result: downloads.append(result["download"])
-        if "upload" in result: uploads.append(result["upload"])
-        if "ping" in result: pings.append(result["ping"])
-        if "jitter" in result: jitters.append(result["jitter"])
-        if "latency" in result: latencies.append(result["latency"])
+    # One iteration's aggregation, scoring, export and rendering; shared by live runs and replay
+    # (timestamp: the recorded time of a replayed row, None for now)
+    def record(result, timestamp=None):
+        nonlocal frame
+        for key in STAT_KEYS:
+            stats[key].add(result.get(key))
+            sketches[key].add(result.get(key))
+        for key in steady:
+            steady[key].add(result.get(key))
+        for key in durations:
+            durations[key].add(result.get(key))
 
         # Calculate AI Health Score
         score = calculate_health_score(
@@ -223,77 +2016,966 @@ def stress_test(duration, test_type="ALL", ping_samples=5, timeout=5000):
             result.get("ping", 0),
             result.get("jitter", 0),
             result.get("latency", 0),
+            result.get("bufferbloat"),
+            weights,
         )
 
+        sketches["score"].add(score)
+        if phases:
+            result.update(phases.add(take_phases()))
+
         # Log to CSV
-        log_to_csv(log_file, result, score)
+        epoch = timestamp.timestamp() if timestamp else None
+        with timed("log"):
+            logger.log(result, score, timestamp)
+            if binary_logger:
+                binary_logger.log(result, score, epoch)
+            if store:
+                store.update(result, score, epoch)
+            if agent:
+                agent.send(result, score, epoch)
+            if metrics:
+                metrics.update(result, score, epoch)
 
-        max_dl = max(downloads) if downloads else 100
-        max_ul = max(uploads) if uploads else 100
+        if view:
+            with timed("render"):
+                max_dl = stats["download"].max or 100
+                max_ul = stats["upload"].max or 100
+                when = timestamp.strftime("%Y-%m-%d %H:%M:%S") if timestamp else datetime.now().strftime("%H:%M:%S")
+                lines = [
+                    Fore.GREEN + f"--- Iteration {iteration} --- ({when})",
+                    Fore.CYAN + render_ascii_bar("Download", result.get("download", "N/A"), max_dl),
+                    Fore.CYAN + render_ascii_bar("Upload", result.get("upload", "N/A"), max_ul),
+                    Fore.CYAN + f"Ping: {result.get('ping', 'N/A')} ms | Jitter: {result.get('jitter', 'N/A')} ms | Latency: {result.get('latency', 'N/A')} ms",
+                ]
+                if bufferbloat:
+                    lines.append(Fore.CYAN + render_bufferbloat(result))
+                if servers:
+                    lines.append(Fore.CYAN + render_servers(result))
+                frame = lines + [render_health_bar(score)]
+                has_steady = "download_steady" in result or "upload_steady" in result
+                view.update(frame + [Fore.MAGENTA + render_steady(result) if has_steady else ""])
+        return score
 
-        if iteration > 1:
-            sys.stdout.write("\033[F" * 7)
+    # Buffered rows are flushed even when the run is interrupted
+    try:
+        if replay is not None:
+            # Virtual time: row timestamps drive the logs and exports; `speed` recorded seconds
+            # pass per wall-clock second (0 = as fast as possible)
+            started = first = None
+            for timestamp, result in replay:
+                if speed:
+                    started = started or time.monotonic()
+                    first = first or timestamp
+                    delay = started + (timestamp - first).total_seconds() / speed - time.monotonic()
+                    if delay > 0:
+                        with timed("sleep"):
+                            time.sleep(delay)
+                with timed(None, "iteration", {"iteration": iteration, "recorded": str(timestamp)}) as span:
+                    score = record(result, timestamp)
+                    span.args.update(score=score, **{key: result[key] for key in STAT_KEYS if key in result})
+                if _tracer:
+                    _tracer.flush()
+                iteration += 1
+
+        while replay is None and time.time() < end_time:
+            if scheduler:
+                with timed("sleep"):
+                    lag = scheduler.wait()
+                if lag is None:
+                    break
+
+            with timed(None, "iteration", {"iteration": iteration}) as span:
+                result = run_speed_test(test_type, ping_samples, timeout, engine, engine_options, bufferbloat, hosts, probe_interval,
+                                        servers, fanout, on_sample if view and not servers else None)
 
-        print(Fore.GREEN + f"--- Iteration {iteration} --- ({datetime.now().strftime('%H:%M:%S')})")
-        print(Fore.CYAN + render_ascii_bar("Download", result.get("download", "N/A"), max_dl))
-        print(Fore.CYAN + render_ascii_bar("Upload", result.get("upload", "N/A"), max_ul))
-        print(Fore.CYAN + f"Ping: {result.get('ping', 'N/A')} ms | Jitter: {result.get('jitter', 'N/A')} ms | Latency: {result.get('latency', 'N/A')} ms")
-        print(render_health_bar(score) + "\n")
+                if scheduler:
+                    result["schedule_lag"] = round(lag * 1000, 2)
+                    lags.add(result["schedule_lag"])
 
-        iteration += 1
-        time.sleep(2)
+                score = record(result)
+                span.args.update(score=score, **{key: result[key] for key in STAT_KEYS if key in result})
+
+            # The result frame often lands inside the --max-fps window of the last live sample;
+            # draw it now rather than leave it hidden for the whole wait before the next iteration
+            if view:
+                with timed("render"):
+                    view.flush()
+            if _tracer:
+                _tracer.flush()
+            iteration += 1
+            if not scheduler:
+                with timed("sleep"):
+                    time.sleep(2)
+    finally:
+        if view:
+            view.flush()
+        logger.close()
+        if binary_logger:
+            binary_logger.close()
+        if store:
+            store.close()
+        if agent:
+            agent.close()
+        if metrics:
+            metrics.close()
 
     # Summary
     print(Fore.YELLOW + "\n=== Stress Test Summary ===")
-    if downloads:
-        print(f"Download: avg {statistics.mean(downloads):.2f} Mbps, min {min(downloads)} Mbps, max {max(downloads)} Mbps")
-    if uploads:
-        print(f"Upload:   avg {statistics.mean(uploads):.2f} Mbps, min {min(uploads)} Mbps, max {max(uploads)} Mbps")
-    if pings:
-        print(f"Ping:     avg {statistics.mean(pings):.2f} ms")
-    if jitters:
-        print(f"Jitter:   avg {statistics.mean(jitters):.2f} ms")
-    if latencies:
-        print(f"Latency:  avg {statistics.mean(latencies):.2f} ms")
+    dl, ul, bloat = stats["download"], stats["upload"], stats["bufferbloat"]
+    if dl.count:
+        print(f"Download: avg {dl.mean:.2f} Mbps, min {dl.min} Mbps, max {dl.max} Mbps, stdev {dl.stdev:.2f}")
+        print(f"          {format_quantiles(sketches['download'])}")
+    if ul.count:
+        print(f"Upload:   avg {ul.mean:.2f} Mbps, min {ul.min} Mbps, max {ul.max} Mbps, stdev {ul.stdev:.2f}")
+        print(f"          {format_quantiles(sketches['upload'])}")
+    if stats["ping"].count:
+        print(f"Ping:     avg {stats['ping'].mean:.2f} ms, {format_quantiles(sketches['ping'], ' ms')}")
+    if stats["jitter"].count:
+        print(f"Jitter:   avg {stats['jitter'].mean:.2f} ms, {format_quantiles(sketches['jitter'], ' ms')}")
+    if stats["latency"].count:
+        print(f"Latency:  avg {stats['latency'].mean:.2f} ms, {format_quantiles(sketches['latency'], ' ms')}")
+    if bloat.count:
+        print(f"Bloat:    avg +{bloat.mean:.2f} ms under load, max +{bloat.max} ms (grade {bufferbloat_grade(bloat.mean)})")
+        print(f"          {format_quantiles(sketches['bufferbloat'], ' ms')}")
+    if steady["download_steady"].count or steady["upload_steady"].count:
+        print("Steady:   " + " | ".join(
+            f"{label} avg {steady[f'{d}_steady'].mean:.2f} Mbps after {steady[f'{d}_ramp'].mean:.0f} ms ramp"
+            for d, label in (("download", "DL"), ("upload", "UL")) if steady[f"{d}_steady"].count))
+    if adaptive:
+        moved = durations["bytes"].mean * durations["bytes"].count / 1_000_000 if durations["bytes"].count else 0
+        print("Adaptive: " + ", ".join(
+            f"{label} avg {durations[f'{d}_duration'].mean:.2f} s" for d, label in (("download", "DL"), ("upload", "UL"))
+            if durations[f"{d}_duration"].count) + f" per test (max {engine_options['duration']} s), {moved:.1f} MB transferred")
+    if scheduler:
+        print(f"Schedule: every {interval}s ({overrun}), lag avg {lags.mean:.1f} ms, max {lags.max or 0} ms, "
+              f"{scheduler.overruns} overruns, {scheduler.skipped} skipped, {scheduler.coalesced} coalesced")
+    write_csv_footer(logger.filename, sketches, extra_fields)
+    if phases:
+        phases.add(take_phases())
+        phases.print_summary()
 
     final_score = calculate_health_score(
-        statistics.mean(downloads) if downloads else 0,
-        statistics.mean(uploads) if uploads else 0,
-        statistics.mean(pings) if pings else 0,
-        statistics.mean(jitters) if jitters else 0,
-        statistics.mean(latencies) if latencies else 0,
-    )
-    status = (
-        "Excellent" if final_score >= 80 else
-        "Good" if final_score >= 60 else
-        "Fair" if final_score >= 40 else
-        "Poor" if final_score >= 20 else
-        "Critical"
+        stats["download"].mean,
+        stats["upload"].mean,
+        stats["ping"].mean,
+        stats["jitter"].mean,
+        stats["latency"].mean,
+        bloat.mean if bloat.count else None,
+        weights,
     )
+    status = health_status(final_score)
 
     print("\n" + render_health_bar(final_score) + f" ({status})")
-    print(Fore.MAGENTA + f"\nResults logged to: {log_file}")
+    if binary_logger:
+        print(Fore.MAGENTA + f"Binary log: {binlog}")
+    if store:
+        print(Fore.MAGENTA + f"Round-robin store: {rrd}")
+    if agent:
+        print(Fore.MAGENTA + f"Streamed {agent.sent} samples to collector {collector} ({agent.dropped} dropped)")
+    if len(logger.files) > 1:
+        print(Fore.MAGENTA + f"\nResults logged to {len(logger.files)} files, latest: {logger.filename}")
+    else:
+        print(Fore.MAGENTA + f"\nResults logged to: {logger.filename}")
+
+# Bundled measurement server: HTTP source/sink plus TCP/UDP echo
+async def _handle_http(reader, writer, source):
+    from urllib.parse import urlsplit
+
+    try:
+        request_line = await reader.readline()
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        parts = request_line.decode("latin-1").split()
+        if len(parts) < 2:
+            return
+        method, target = parts[0], urlsplit(parts[1])
+
+        if method == "GET" and target.path == NATIVE_DOWNLOAD_PATH:
+            query = dict(p.partition("=")[::2] for p in target.query.split("&") if p)
+            remaining = int(query.get("bytes", NATIVE_UPLOAD_BYTES))
+            writer.write((
+                "HTTP/1.1 200 OK\r\nContent-Type: application/octet-stream\r\n"
+                f"Content-Length: {remaining}\r\nConnection: close\r\n\r\n"
+            ).encode())
+            while remaining > 0:
+                chunk = source if remaining >= len(source) else source[:remaining]
+                writer.write(chunk)
+                remaining -= len(chunk)
+                await writer.drain()
+
+        elif method == "POST" and target.path == NATIVE_UPLOAD_PATH:
+            remaining = int(headers.get("content-length", NATIVE_UPLOAD_BYTES))
+            received = 0
+            while remaining > 0:
+                data = await reader.read(min(remaining, SERVE_CHUNK_SIZE))
+                if not data:
+                    break
+                received += len(data)
+                remaining -= len(data)
+            body = json.dumps({"bytes": received}).encode()
+            writer.write(
+                b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                + f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+
+        else:
+            writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+            await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+async def _handle_tcp_echo(reader, writer):
+    try:
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            writer.write(data)
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+async def _serve(host, port, echo_port):
+    class _UdpEchoProtocol(asyncio.DatagramProtocol):
+        def connection_made(self, transport):
+            self.transport = transport
+
+        def datagram_received(self, data, addr):
+            self.transport.sendto(data, addr)
+
+    loop = asyncio.get_running_loop()
+    source = memoryview(os.urandom(SERVE_CHUNK_SIZE))
+    http_server = await asyncio.start_server(lambda r, w: _handle_http(r, w, source), host, port)
+    echo_server = await asyncio.start_server(_handle_tcp_echo, host, echo_port)
+    await loop.create_datagram_endpoint(_UdpEchoProtocol, local_addr=(host, echo_port))
+
+    print(Fore.GREEN + f"SpeedO server listening on http://{host}:{port}")
+    print(Fore.CYAN + f"  GET  {NATIVE_DOWNLOAD_PATH}[?bytes=N]  download source")
+    print(Fore.CYAN + f"  POST {NATIVE_UPLOAD_PATH}              upload sink")
+    print(Fore.CYAN + f"  TCP/UDP echo on port {echo_port}")
+    async with http_server, echo_server:
+        await asyncio.gather(http_server.serve_forever(), echo_server.serve_forever())
+
+def run_server(host="0.0.0.0", port=SERVE_PORT, echo_port=None):
+    try:
+        asyncio.run(_serve(host, port, echo_port or port + 1))
+    except OSError as e:
+        print(Fore.RED + f"Could not start server: {e}")
+        sys.exit(1)
+
+# Stats for one slice of a log (a whole file or one time bucket)
+class LogSummary:
+    def __init__(self):
+        self.rows = 0
+        self.first = None
+        self.last = None
+        self.stats = {}
+        self.sketches = {}
+        self.health = dict.fromkeys(HEALTH_STATUSES, 0)
+
+    def add(self, timestamp, values):
+        self.rows += 1
+        self.first = self.first or timestamp
+        self.last = timestamp
+        for key, value in values.items():
+            if key not in self.stats:
+                self.stats[key] = RunningStats()
+                self.sketches[key] = QuantileSketch()
+            self.stats[key].add(value)
+            self.sketches[key].add(value)
+        if "score" in values:
+            self.health[health_status(values["score"])] += 1
+
+    def merge(self, other):
+        self.rows += other.rows
+        if other.first and (not self.first or other.first < self.first):
+            self.first = other.first
+        if other.last and (not self.last or other.last > self.last):
+            self.last = other.last
+        for key in other.stats:
+            self.stats.setdefault(key, RunningStats()).merge(other.stats[key])
+            self.sketches.setdefault(key, QuantileSketch()).merge(other.sketches[key])
+        for status, count in other.health.items():
+            self.health[status] += count
+        return self
+
+def _open_log(path):
+    if path.endswith(".gz"):
+        import gzip
+        return gzip.open(path, "rt", newline="")
+    return open(path, newline="")
+
+# Parse one CSV row into (datetime, {metric: float}); None for headers, footers and bad rows
+def _parse_log_row(row):
+    stamp = row.get("timestamp") or ""
+    if not stamp or stamp.startswith("#"):
+        return None
+    try:
+        timestamp = datetime.strptime(stamp, "%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        return None
+    values = {}
+    for column, key in REPORT_COLUMNS.items():
+        try:
+            values[key] = float(row[column])
+        except (KeyError, TypeError, ValueError):
+            pass
+    return timestamp, values
+
+# Worker: stream one log file row by row into a file summary plus time buckets
+def scan_log_file(path, bucket="hour"):
+    summary = LogSummary()
+    buckets = {}
+    bucket_format = REPORT_BUCKETS[bucket]
+    with _open_log(path) as f:
+        for row in csv.DictReader(f):
+            parsed = _parse_log_row(row)
+            if not parsed:
+                continue
+            timestamp, values = parsed
+            summary.add(timestamp, values)
+            key = timestamp.strftime(bucket_format)
+            if key not in buckets:
+                buckets[key] = LogSummary()
+            buckets[key].add(timestamp, values)
+    return path, summary, buckets
+
+def find_log_files(logs_dir="logs"):
+    import glob
+    return sorted(glob.glob(os.path.join(logs_dir, "speedo_*.csv")) + glob.glob(os.path.join(logs_dir, "speedo_*.csv.gz")))
+
+# Scan files across a process pool and merge into combined and per-bucket summaries
+def build_report(files, bucket="hour", workers=None):
+    if workers == 1 or len(files) < 2:
+        scanned = [scan_log_file(path, bucket) for path in files]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            scanned = list(pool.map(scan_log_file, files, [bucket] * len(files)))
+
+    per_file = {}
+    combined = LogSummary()
+    buckets = {}
+    for path, summary, file_buckets in scanned:
+        per_file[path] = summary
+        combined.merge(summary)
+        for key, bucket_summary in file_buckets.items():
+            buckets.setdefault(key, LogSummary()).merge(bucket_summary)
+    return per_file, combined, dict(sorted(buckets.items()))
+
+def _summary_dict(summary):
+    data = {"rows": summary.rows, "health": summary.health}
+    if summary.first:
+        data["first"] = summary.first.isoformat(sep=" ")
+        data["last"] = summary.last.isoformat(sep=" ")
+    for key, stats in summary.stats.items():
+        if stats.count:
+            data[key] = {"count": stats.count, "mean": round(stats.mean, 2), "min": stats.min, "max": stats.max}
+            data[key].update({f"p{q:g}": round(summary.sketches[key].quantile(q), 2) for q in QUANTILES})
+    return data
+
+def _fmt(summary, key, attr="mean"):
+    stats = summary.stats.get(key)
+    if not stats or not stats.count:
+        return "N/A"
+    if attr in ("mean", "min", "max"):
+        return f"{getattr(stats, attr):.2f}"
+    return f"{summary.sketches[key].quantile(attr):.2f}"
+
+def print_report(per_file, combined, buckets, bucket="hour", worst=5):
+    print(Fore.YELLOW + f"=== SpeedO Report: {len(per_file)} files, {combined.rows} rows ===")
+    if not combined.rows:
+        print(Fore.RED + "No result rows found.")
+        return
+
+    print(Fore.GREEN + "\nPer file:")
+    for path, summary in per_file.items():
+        print(Fore.CYAN + f"  {os.path.basename(path):<40} {summary.rows:>7} rows | "
+              f"DL {_fmt(summary, 'download')} | UL {_fmt(summary, 'upload')} Mbps | "
+              f"Ping p99 {_fmt(summary, 'ping', 99)} ms | Score {_fmt(summary, 'score')}")
+
+    print(Fore.GREEN + f"\nCombined ({combined.first} -> {combined.last}):")
+    for key, unit in (("download", " Mbps"), ("upload", " Mbps"), ("ping", " ms"), ("jitter", " ms"),
+                      ("latency", " ms"), ("bufferbloat", " ms"), ("score", "")):
+        stats = combined.stats.get(key)
+        if stats and stats.count:
+            print(f"  {key.capitalize():<12} avg {stats.mean:.2f}{unit}, min {stats.min}, max {stats.max} | "
+                  f"{format_quantiles(combined.sketches[key], unit)}")
+
+    print(Fore.GREEN + "\nHealth score distribution:")
+    total = sum(combined.health.values()) or 1
+    for status in HEALTH_STATUSES:
+        count = combined.health[status]
+        bar = "█" * int(count / total * 30)
+        print(f"  {status:<10} {count:>7} ({count / total * 100:5.1f}%) {bar}")
+
+    print(Fore.GREEN + f"\n{REPORT_BUCKET_LABELS[bucket]} aggregates:")
+    print(f"  {'period':<17} {'rows':>6} {'DL avg':>9} {'DL p10':>9} {'UL avg':>9} {'Ping p90':>9} {'Score avg':>9} {'Score min':>9}")
+    for key, summary in buckets.items():
+        score_min = _fmt(summary, "score", "min")
+        print(f"  {key:<17} {summary.rows:>6} {_fmt(summary, 'download'):>9} {_fmt(summary, 'download', 10):>9} "
+              f"{_fmt(summary, 'upload'):>9} {_fmt(summary, 'ping', 90):>9} {_fmt(summary, 'score'):>9} {score_min:>9}")
+
+    scored = [(summary.stats["score"].mean, key, summary) for key, summary in buckets.items()
+              if "score" in summary.stats and summary.stats["score"].count]
+    if scored:
+        print(Fore.GREEN + f"\nWorst {bucket}s by health score:")
+        for mean, key, summary in sorted(scored, key=lambda item: item[0])[:worst]:
+            print(Fore.RED + f"  {key:<17} score {mean:.1f} | DL {_fmt(summary, 'download')} Mbps | "
+                  f"Ping p90 {_fmt(summary, 'ping', 90)} ms | {summary.rows} rows")
+
+def run_report(logs_dir="logs", bucket="hour", workers=None, worst=5, json_path=None):
+    files = find_log_files(logs_dir)
+    if not files:
+        print(Fore.RED + f"No speedo_*.csv logs found in {logs_dir}")
+        sys.exit(1)
+
+    per_file, combined, buckets = build_report(files, bucket, workers)
+    print_report(per_file, combined, buckets, bucket, worst)
+
+    if json_path:
+        with open(json_path, "w") as f:
+            json.dump({
+                "files": {path: _summary_dict(summary) for path, summary in per_file.items()},
+                "combined": _summary_dict(combined),
+                "buckets": {key: _summary_dict(summary) for key, summary in buckets.items()},
+            }, f, indent=2)
+        print(Fore.MAGENTA + f"\nReport written to: {json_path}")
+
+def _parse_time_arg(value):
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            pass
+    raise argparse.ArgumentTypeError(f"invalid time {value!r} (use 'YYYY-MM-DD[ HH:MM[:SS]]')")
+
+# Print the rows of every log that fall inside [start, end)
+def run_query(start, end, logs_dir="logs", files=None, out=None):
+    files = files or find_log_files(logs_dir)
+    writer = None
+    target = open(out, "w", newline="") if out else sys.stdout
+    matched = 0
+    try:
+        for path in files:
+            for row in query_log_range(path, start.timestamp(), end.timestamp()):
+                if writer is None:
+                    writer = csv.DictWriter(target, fieldnames=list(row), extrasaction="ignore")
+                    writer.writeheader()
+                writer.writerow(row)
+                matched += 1
+    finally:
+        if out:
+            target.close()
+    print(Fore.MAGENTA + f"{matched} rows between {start} and {end}" + (f" written to {out}" if out else ""), file=sys.stderr)
+
+# Print a tier of the round-robin store
+def run_trend(path=RRD_DEFAULT_PATH, tier="hour", metric="download"):
+    if not os.path.exists(path):
+        print(Fore.RED + f"No round-robin store at {path}")
+        sys.exit(1)
+    try:
+        store = RoundRobinStore(path)
+    except (OSError, ValueError) as e:
+        print(Fore.RED + f"Could not open round-robin store {path}: {e}")
+        sys.exit(1)
+    try:
+        rows = store.fetch(tier)
+    finally:
+        store.close()
+
+    print(Fore.YELLOW + f"=== {metric} trend ({tier}, {len(rows)} rows) from {path} ===")
+    if tier == "raw":
+        for stamp, values in rows:
+            print(f"  {datetime.fromtimestamp(stamp).strftime('%Y-%m-%d %H:%M:%S')}  {values[metric]:.2f}")
+        return
+    print(f"  {'period':<17} {'min':>9} {'mean':>9} {'max':>9} {'count':>6}")
+    for stamp, values in rows:
+        low, mean, high, count = values[metric]
+        if count:
+            print(f"  {datetime.fromtimestamp(stamp).strftime('%Y-%m-%d %H:%M'):<17} {low:>9.2f} {mean:>9.2f} {high:>9.2f} {int(count):>6}")
+
+# Rescore one CSV log with the given weights into out_dir;
+# returns (rows, old mean, new mean, whether ping stood in for a missing latency column)
+def rescore_file(path, out_dir=RESCORE_DEFAULT_OUT, weights=HEALTH_WEIGHTS):
+    np = _require("numpy", "numpy")
+    with _open_log(path) as f:
+        header = f.readline()
+        body = f.read()
+    columns = next(csv.reader([header]))
+    if "ai_health_score" not in columns:
+        raise ValueError("no ai_health_score column")
+    numeric = [c for c in REPORT_COLUMNS if c in columns]
+    lines = body.splitlines()
+    data_lines = [line for line in lines if line and line[0] != "#"]
+    if not data_lines:
+        return 0, None, None, "latency_ms" not in columns
+
+    # One C-level parse of every numeric column; N/A becomes NaN, "#" footer rows are skipped
+    data = np.loadtxt(io.StringIO(body.replace("N/A", "nan")), delimiter=",", comments="#", ndmin=2,
+                      usecols=[columns.index(c) for c in numeric], dtype=np.float64)
+    col = {REPORT_COLUMNS[c]: data[:, i] for i, c in enumerate(numeric)}
+    rows = len(data)
+    nan = np.full(rows, np.nan)
+    # Old speedtest-cli logs have no latency column; the CLI backend reports ping as latency then
+    latency = col.get("latency", col.get("ping", nan))
+    # N/A means the test did not measure the metric (-T D/U/P), which live scoring counts as 0
+    download, upload, ping, jitter, latency = (np.nan_to_num(c, nan=0.0) for c in (
+        col.get("download", nan), col.get("upload", nan), col.get("ping", nan), col.get("jitter", nan), latency))
+    scores = health_scores(download, upload, ping, jitter, latency, col.get("bufferbloat"), weights)
+
+    # Splice the new scores into the original lines, written the way live runs write them;
+    # "#p.." footer rows (always last) get their score quantiles recomputed from the same
+    # sketch the live footer uses
+    k = columns.index("ai_health_score")
+    def splice(line, score):
+        fields = line.split(",", k + 1)
+        fields[k] = str(max(0, min(100, score)))
+        return ",".join(fields)
+
+    out_lines = list(map(splice, data_lines, scores.tolist()))
+    sketch = QuantileSketch()
+    sketch.add_array(scores)
+    # Live scores come out of max(0, min(100, ...)), so a clamped 0 or 100 is an int there
+    sketch.min, sketch.max = max(0, min(100, sketch.min)), max(0, min(100, sketch.max))
+    for line in lines:
+        if line.startswith("#p"):
+            fields = line.split(",")
+            if len(fields) > k:
+                fields[k] = str(round(sketch.quantile(float(fields[0][2:])), 2))
+            out_lines.append(",".join(fields))
+
+    os.makedirs(out_dir, exist_ok=True)
+    out_path = os.path.join(out_dir, os.path.basename(path))
+    if out_path.endswith(".gz"):
+        import gzip
+        out = gzip.open(out_path, "wt", newline="")
+    else:
+        out = open(out_path, "w", newline="")
+    with out:
+        out.write(header)
+        out.write("\r\n".join(out_lines) + "\r\n" if out_lines else "")
+    old = col.get("score", nan)
+    old_mean = float(np.nanmean(old)) if rows and not np.isnan(old).all() else None
+    return rows, old_mean, float(scores.mean()) if rows else None, "latency" not in col
+
+# Recompute ai_health_score for every log in a directory with (possibly new) weights
+def run_rescore(logs_dir="logs", files=None, out_dir=RESCORE_DEFAULT_OUT, weights=HEALTH_WEIGHTS):
+    files = files or find_log_files(logs_dir)
+    if not files:
+        print(Fore.RED + f"No logs found in {logs_dir}")
+        return
+    changed = {k: v for k, v in weights.items() if v != HEALTH_WEIGHTS[k]}
+    print(Fore.YELLOW + f"=== Rescoring {len(files)} log(s) into {out_dir} ===")
+    if changed:
+        print(Fore.CYAN + "Weights: " + ", ".join(f"{k}={v:g}" for k, v in changed.items()))
+    total = 0
+    for path in files:
+        try:
+            rows, old_mean, new_mean, no_latency = rescore_file(path, out_dir, weights)
+        except (OSError, ValueError) as e:
+            print(Fore.RED + f"  {os.path.basename(path):<36} skipped: {e}")
+            continue
+        total += rows
+        old = f"{old_mean:.1f}" if old_mean is not None else "N/A"
+        new = f"{new_mean:.1f}" if new_mean is not None else "N/A"
+        note = " (no latency column, used ping)" if no_latency else ""
+        print(Fore.CYAN + f"  {os.path.basename(path):<36} {rows:>8} rows  avg score {old} -> {new}{note}")
+    print(Fore.MAGENTA + f"{total} rows rescored")
+
+# Logged rows as (datetime, result) in file order, for `speedo replay`
+def read_replay(files):
+    for path in files:
+        with _open_log(path) as f:
+            for row in csv.DictReader(f):
+                stamp = row.get("timestamp") or ""
+                if not stamp or stamp.startswith("#"):
+                    continue
+                try:
+                    timestamp = datetime.strptime(stamp, "%Y-%m-%d %H:%M:%S")
+                except ValueError:
+                    continue
+                result = {}
+                for column, key in REPLAY_COLUMNS.items():
+                    try:
+                        result[key] = float(row[column])
+                    except (KeyError, TypeError, ValueError):
+                        pass
+                # Old speedtest-cli logs have no latency column; the CLI backend reports ping as latency then
+                # (a logged N/A is a missing measurement, scored as 0 like live runs and `speedo rescore`)
+                if "latency_ms" not in row and "ping" in result:
+                    result["latency"] = result["ping"]
+                if "bufferbloat" in result:
+                    result["bufferbloat_grade"] = bufferbloat_grade(result["bufferbloat"])
+                yield timestamp, result
+
+# Feed recorded logs through the stress_test pipeline with virtual time
+def run_replay(logs_dir="logs", files=None, out_dir=REPLAY_DEFAULT_OUT, speed=0, weights=HEALTH_WEIGHTS, headless=False,
+               max_fps=LIVE_MAX_FPS, metrics_port=None, metrics_host=METRICS_HOST, rrd=None, profile=False):
+    files = files or find_log_files(logs_dir)
+    if not files:
+        print(Fore.RED + f"No logs found in {logs_dir}")
+        return
+    try:
+        with _open_log(files[0]) as f:
+            columns = next(csv.reader(f), [])
+    except OSError as e:
+        print(Fore.RED + f"Could not read {files[0]}: {e}")
+        sys.exit(1)
+    pace = f"{speed:g}x" if speed else "full speed"
+    print(Fore.YELLOW + f"Replaying {len(files)} log(s) at {pace}...")
+    stress_test(None, bufferbloat="bufferbloat_ms" in columns, log_options={"directory": out_dir}, rrd=rrd,
+                metrics_port=metrics_port, metrics_host=metrics_host, headless=headless, max_fps=max_fps,
+                profile=profile, replay=read_replay(files), speed=speed, weights=weights)
+
+# Agent side: a bounded queue drained by a sender thread over one persistent TCP connection.
+# sendall() blocks when the collector falls behind (TCP backpressure); if the queue fills up
+# meanwhile, the oldest samples are dropped and counted.
+class AgentClient:
+    def __init__(self, address, agent_id=None):
+        host, _, port = address.rpartition(":")
+        self.address = (host or "127.0.0.1", int(port or COLLECTOR_PORT))
+        self.agent_id = agent_id or socket.gethostname()
+        self.sent = 0
+        self.dropped = 0
+        self._queue = deque()
+        self._ready = threading.Condition()
+        self._closing = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def send(self, result, score, timestamp=None):
+        values = []
+        for field in AGENT_FIELDS:
+            value = score if field == "score" else result.get(field)
+            values.append(float(value) if isinstance(value, (int, float)) else math.nan)
+        record = AGENT_RECORD.pack(timestamp if timestamp is not None else time.time(), *values)
+        with self._ready:
+            if len(self._queue) >= AGENT_QUEUE_SIZE:
+                self._queue.popleft()
+                self.dropped += 1
+            self._queue.append(record)
+            self._ready.notify()
+
+    def _connect(self):
+        sock = socket.create_connection(self.address, timeout=10)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        hello = json.dumps({"agent": self.agent_id, "version": "2.3", "fields": AGENT_FIELDS}).encode()
+        sock.sendall(FRAME_HEADER.pack(len(hello), FRAME_HELLO) + hello)
+        return sock
+
+    def _run(self):
+        sock = None
+        backoff = 1
+        while True:
+            with self._ready:
+                # Wait briefly so records that arrive close together share one frame
+                if not self._queue and not self._closing:
+                    self._ready.wait(AGENT_FLUSH_INTERVAL)
+                if not self._queue and self._closing:
+                    break
+                batch = [self._queue.popleft() for _ in range(min(AGENT_BATCH_SIZE, len(self._queue)))]
+            if not batch:
+                continue
+            payload = BATCH_HEADER.pack(len(batch), self.dropped) + b"".join(batch)
+            try:
+                if sock is None:
+                    sock = self._connect()
+                    backoff = 1
+                sock.sendall(FRAME_HEADER.pack(len(payload), FRAME_BATCH) + payload)
+                self.sent += len(batch)
+            except OSError:
+                if sock:
+                    sock.close()
+                sock = None
+                with self._ready:
+                    # Put the batch back (oldest first) and retry after a backoff
+                    self._queue.extendleft(reversed(batch))
+                    while len(self._queue) > AGENT_QUEUE_SIZE:
+                        self._queue.popleft()
+                        self.dropped += 1
+                    if self._closing:
+                        break
+                    self._ready.wait(backoff)
+                backoff = min(backoff * 2, 30)
+        if sock:
+            sock.close()
+
+    def close(self, timeout=5):
+        with self._ready:
+            self._closing = True
+            self._ready.notify()
+        self._thread.join(timeout)
+
+# Collector side: per-agent and fleet-wide running stats, updated as frames arrive
+class FleetState:
+    def __init__(self):
+        self.agents = {}
+        self.fleet = {field: RunningStats() for field in AGENT_FIELDS}
+        self.sketches = {field: QuantileSketch() for field in AGENT_FIELDS}
+
+    def add(self, agent_id, timestamp, values):
+        agent = self.agents.setdefault(agent_id, {
+            "stats": {field: RunningStats() for field in AGENT_FIELDS},
+            "last": {}, "last_seen": 0, "samples": 0, "dropped": 0, "connected": True,
+        })
+        agent["samples"] += 1
+        agent["last_seen"] = timestamp
+        for field, value in zip(AGENT_FIELDS, values):
+            if math.isnan(value):
+                continue
+            agent["stats"][field].add(value)
+            agent["last"][field] = value
+            self.fleet[field].add(value)
+            self.sketches[field].add(value)
+
+def print_fleet(state):
+    total = sum(agent["samples"] for agent in state.agents.values())
+    online = sum(agent["connected"] for agent in state.agents.values())
+    print(Fore.YELLOW + f"\n=== Fleet: {online}/{len(state.agents)} agents online, {total} samples "
+          f"({datetime.now().strftime('%H:%M:%S')}) ===")
+    print(f"  {'agent':<20} {'samples':>7} {'dropped':>7} {'DL avg':>9} {'UL avg':>9} {'Ping avg':>9} {'Score':>6} {'last seen':>9}")
+    for agent_id, agent in sorted(state.agents.items()):
+        stats = agent["stats"]
+        seen = datetime.fromtimestamp(agent["last_seen"]).strftime("%H:%M:%S") if agent["last_seen"] else "-"
+        print((Fore.CYAN if agent["connected"] else Fore.RED) +
+              f"  {agent_id:<20} {agent['samples']:>7} {agent['dropped']:>7} {stats['download'].mean:>9.2f} "
+              f"{stats['upload'].mean:>9.2f} {stats['ping'].mean:>9.2f} {agent['last'].get('score', 0):>6.1f} {seen:>9}")
+    for field, unit in (("download", " Mbps"), ("upload", " Mbps"), ("ping", " ms"), ("score", "")):
+        if state.fleet[field].count:
+            print(f"  Fleet {field:<9} avg {state.fleet[field].mean:.2f}{unit} | {format_quantiles(state.sketches[field], unit)}")
+
+async def _handle_agent(reader, writer, state, fleet_log):
+    peer = writer.get_extra_info("peername")
+    agent_id = f"{peer[0]}:{peer[1]}" if peer else "unknown"
+    try:
+        while True:
+            length, kind = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+            if length > MAX_FRAME_SIZE:
+                raise ValueError(f"frame of {length} bytes from {agent_id}")
+            payload = await reader.readexactly(length)
+            if kind == FRAME_HELLO:
+                agent_id = json.loads(payload).get("agent", agent_id)
+                print(Fore.GREEN + f"Agent connected: {agent_id}")
+                if agent_id in state.agents:
+                    state.agents[agent_id]["connected"] = True
+            elif kind == FRAME_BATCH:
+                count, dropped = BATCH_HEADER.unpack_from(payload)
+                for timestamp, *values in AGENT_RECORD.iter_unpack(payload[BATCH_HEADER.size:BATCH_HEADER.size + count * AGENT_RECORD.size]):
+                    state.add(agent_id, timestamp, values)
+                    if fleet_log:
+                        fleet_log.writerow([datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S"), agent_id] +
+                                           ["N/A" if math.isnan(v) else round(v, 2) for v in values])
+                if agent_id in state.agents:
+                    state.agents[agent_id]["dropped"] = dropped
+    except (asyncio.IncompleteReadError, ConnectionError, ValueError, struct.error):
+        pass
+    finally:
+        if agent_id in state.agents:
+            state.agents[agent_id]["connected"] = False
+        print(Fore.RED + f"Agent disconnected: {agent_id}")
+        writer.close()
+
+async def _collect(host, port, report_interval, fleet_log, fleet_file):
+    state = FleetState()
+    server = await asyncio.start_server(lambda r, w: _handle_agent(r, w, state, fleet_log), host, port)
+    print(Fore.GREEN + f"SpeedO collector listening on {host}:{port}")
+    async with server:
+        while True:
+            await asyncio.sleep(report_interval)
+            if state.agents:
+                print_fleet(state)
+            if fleet_file:
+                fleet_file.flush()
+
+def run_collector(host="0.0.0.0", port=COLLECTOR_PORT, report_interval=10, fleet_csv=None):
+    fleet_file = fleet_log = None
+    if fleet_csv:
+        new = not os.path.exists(fleet_csv)
+        fleet_file = open(fleet_csv, "a", newline="")
+        fleet_log = csv.writer(fleet_file)
+        if new:
+            fleet_log.writerow(["timestamp", "agent", "download_mbps", "upload_mbps", "ping_ms",
+                                "jitter_ms", "latency_ms", "bufferbloat_ms", "ai_health_score"])
+    try:
+        asyncio.run(_collect(host, port, report_interval, fleet_log, fleet_file))
+    except OSError as e:
+        print(Fore.RED + f"Could not start collector: {e}")
+        sys.exit(1)
+    finally:
+        if fleet_file:
+            fleet_file.close()
 
 # Parse CLI arguments
 def parse_args():
-    parser = argparse.ArgumentParser(description="SpeedO v2.3 - Internet Speed & Stress Test Tool")
-    parser.add_argument("-S", "--stress", help="Stress mode (L/M/H/V/E/D/Y) or seconds", default=None)
-    parser.add_argument("-T", "--test", help="Specific test: U (upload), D (download), P (ping)", default="ALL")
-    parser.add_argument("-r", "--run", type=int, help="Auto-start after delay in seconds", default=0)
-    parser.add_argument("-P", "--ping", type=int, help="Number of ping samples", default=5)
-    parser.add_argument("-O", "--timeout", type=int, help="Ping timeout (ms)", default=5000)
+    # Test options are shared by the default command and `agent`
+    test_options = argparse.ArgumentParser(add_help=False, allow_abbrev=False)
+    test_options.add_argument("-S", "--stress", help="Stress mode (L/M/H/V/E/D/Y) or seconds", default=None)
+    test_options.add_argument("-T", "--test", help="Specific test: U (upload), D (download), P (ping)", default="ALL")
+    test_options.add_argument("-r", "--run", type=int, help="Auto-start after delay in seconds", default=0)
+    test_options.add_argument("-P", "--ping", type=int, help="Number of ping samples", default=5)
+    test_options.add_argument("-O", "--timeout", type=int, help="Ping timeout (ms)", default=5000)
+    test_options.add_argument("-E", "--engine", choices=["cli", "speedtest", "native"], help="Measurement backend: cli (speedtest-cli subprocess), speedtest (in-process, cached server) or native (built-in asyncio)", default="cli")
+    test_options.add_argument("--endpoint", help="Base URL for the native engine (serves /download and /upload)", default=None)
+    test_options.add_argument("--streams", type=int, help="Parallel streams for the native engine", default=NATIVE_STREAMS)
+    test_options.add_argument("--duration", type=float, help="Seconds per direction for the native engine (the upper bound with --adaptive)", default=NATIVE_DURATION)
+    test_options.add_argument("--adaptive", type=float, nargs="?", const=ADAPTIVE_BAND, metavar="PCT",
+                              help=f"Native engine: stop each direction once the throughput estimate is stable within +/-PCT%% (default {ADAPTIVE_BAND})", default=None)
+    test_options.add_argument("--min-duration", type=float, help="Seconds per direction before --adaptive may stop a test", default=ADAPTIVE_MIN_DURATION)
+    test_options.add_argument("-B", "--bufferbloat", action="store_true", help="Probe latency during download/upload and grade bufferbloat")
+    test_options.add_argument("--hosts", help="Comma-separated probe targets: host, tcp://host:port or udp://host:port", default=None)
+    test_options.add_argument("--hosts-file", help="File with one probe target per line", default=None)
+    test_options.add_argument("--probe-interval", type=float, help="Seconds between probes to each host", default=PROBE_INTERVAL)
+    test_options.add_argument("--log-flush-rows", type=int, help="Buffer this many CSV rows before writing", default=1)
+    test_options.add_argument("--log-flush-secs", type=float, help="Also flush buffered CSV rows after this many seconds", default=0)
+    test_options.add_argument("--log-fsync", action="store_true", help="fsync the CSV log on every flush")
+    test_options.add_argument("--log-rotate-mb", type=float, help="Start a new CSV log after this many MB", default=0)
+    test_options.add_argument("--log-rotate-hours", type=float, help="Start a new CSV log after this many hours", default=0)
+    test_options.add_argument("--log-gzip", action="store_true", help="gzip rotated CSV logs")
+    test_options.add_argument("--binlog", help="Also append results to this compact binary log", default=None)
+    test_options.add_argument("--rrd", help=f"Round-robin store for long runs (default for D/Y: {RRD_DEFAULT_PATH}; 'off' disables)", default=None)
+    test_options.add_argument("--interval", type=float, help="Target seconds between stress iterations (deadline-based)", default=None)
+    test_options.add_argument("--overrun", choices=OVERRUN_POLICIES, help="What to do when an iteration misses its deadline", default="skip")
+    test_options.add_argument("--servers", help="Comma-separated speedtest server IDs (or native endpoint URLs) to measure each iteration", default=None)
+    test_options.add_argument("--fanout", choices=["staggered", "concurrent"], help="Measure --servers one after another or all at once", default="staggered")
+    test_options.add_argument("--timeline", action="store_true", help="Log steady-state columns and a .timeline sidecar with 100 ms throughput samples (native engine)")
+    test_options.add_argument("--headless", action="store_true", help="No banner, colors or live view (cron/systemd)")
+    test_options.add_argument("--max-fps", type=float, help="Maximum live view redraws per second (0 = unlimited)", default=LIVE_MAX_FPS)
+    test_options.add_argument("--profile", action="store_true", help="Time each phase (spawn, backend, parse, ping, sleep, render, log); adds phase_*_ms log columns and a summary")
+    test_options.add_argument("--profile-hook", choices=PROFILE_HOOKS, help="Run the whole test under cProfile or pyinstrument", default=None)
+    test_options.add_argument("--profile-out", help="Save the --profile-hook output here (.prof for cProfile, .html for pyinstrument)", default=None)
+    test_options.add_argument("--trace", help="Write each iteration's spans (speedtest, download/upload, jitter, pings, log, render) as a Chrome/Perfetto trace to this file", default=None)
+    test_options.add_argument("--metrics-port", type=int, help="Serve OpenMetrics on this port during stress tests", default=None)
+    test_options.add_argument("--metrics-host", help="Address for the metrics endpoint", default=METRICS_HOST)
+    test_options.add_argument("--cache-ttl", type=int, help="Seconds to reuse the speedtest config and server selection", default=SPEEDTEST_CACHE_TTL)
+    test_options.add_argument("--echo-port", type=int, help="UDP echo port of a speedo server, used for jitter with the native engine", default=None)
+
+    parser = argparse.ArgumentParser(description="SpeedO v2.3 - Internet Speed & Stress Test Tool",
+                                     parents=[test_options], allow_abbrev=False)
+
+    subparsers = parser.add_subparsers(dest="command")
+    serve = subparsers.add_parser("serve", help="Run a local measurement server (download source, upload sink, echo)")
+    serve.add_argument("--host", help="Address to bind", default="0.0.0.0")
+    serve.add_argument("--port", type=int, help="HTTP port", default=SERVE_PORT)
+    serve.add_argument("--echo-port", dest="serve_echo_port", type=int, help="TCP/UDP echo port (default: port + 1)", default=None)
+
+    report = subparsers.add_parser("report", help="Summarize the CSV logs in a directory")
+    report.add_argument("--logs", help="Logs directory", default="logs")
+    report.add_argument("--bucket", choices=list(REPORT_BUCKETS), help="Time bucket for aggregates", default="hour")
+    report.add_argument("--workers", type=int, help="Worker processes (default: all cores)", default=None)
+    report.add_argument("--worst", type=int, help="Number of worst periods to list", default=5)
+    report.add_argument("--json", dest="json_path", help="Also write the report as JSON", default=None)
+
+    query = subparsers.add_parser("query", help="Print logged rows in a time range using the sidecar indexes")
+    query.add_argument("files", nargs="*", help="Log files (default: every log in --logs)")
+    query.add_argument("--logs", help="Logs directory", default="logs")
+    query.add_argument("--from", dest="start", type=_parse_time_arg, required=True, help="Start time, 'YYYY-MM-DD HH:MM[:SS]'")
+    query.add_argument("--to", dest="end", type=_parse_time_arg, required=True, help="End time (exclusive)")
+    query.add_argument("--out", help="Write matching rows to this CSV instead of stdout", default=None)
+
+    rescore = subparsers.add_parser("rescore", help="Recompute AI health scores of logged rows with current or custom weights")
+    rescore.add_argument("files", nargs="*", help="Log files (default: every log in --logs)")
+    rescore.add_argument("--logs", help="Logs directory", default="logs")
+    rescore.add_argument("--out", dest="rescore_out", help="Directory for rescored logs", default=RESCORE_DEFAULT_OUT)
+    rescore.add_argument("--weights", type=parse_weights, default=HEALTH_WEIGHTS,
+                         help="JSON file or key=value list overriding the score weights, e.g. download_full_mbps=500")
+
+    replay = subparsers.add_parser("replay", help="Feed logged results back through scoring, rendering and export, in virtual time")
+    replay.add_argument("files", nargs="*", help="Log files, replayed in order (default: every log in --logs)")
+    replay.add_argument("--logs", help="Logs directory", default="logs")
+    replay.add_argument("--out", dest="replay_out", help="Directory for the replayed run's CSV log", default=REPLAY_DEFAULT_OUT)
+    replay.add_argument("--speed", type=float, help="Recorded seconds per wall-clock second, e.g. 3600 = an hour per second (0 = as fast as possible)", default=0)
+    replay.add_argument("--weights", type=parse_weights, default=HEALTH_WEIGHTS,
+                        help="JSON file or key=value list overriding the score weights, e.g. download_full_mbps=500")
+    replay.add_argument("--headless", action="store_true", help="No banner, colors or live view")
+    replay.add_argument("--max-fps", type=float, help="Maximum live view redraws per second (0 = unlimited)", default=LIVE_MAX_FPS)
+    replay.add_argument("--metrics-port", type=int, help="Serve OpenMetrics on this port while replaying", default=None)
+    replay.add_argument("--metrics-host", help="Address for the metrics endpoint", default=METRICS_HOST)
+    replay.add_argument("--rrd", help="Also feed this round-robin store", default=None)
+    replay.add_argument("--profile", action="store_true", help="Time the log and render phases; adds phase_*_ms log columns and a summary")
+    replay.add_argument("--trace", help="Write each replayed iteration's spans as a Chrome/Perfetto trace to this file", default=None)
+
+    trend = subparsers.add_parser("trend", help="Show long-term trends from the round-robin store")
+    trend.add_argument("--rrd", dest="trend_rrd", help="Round-robin store file", default=RRD_DEFAULT_PATH)
+    trend.add_argument("--tier", choices=["raw"] + list(RRD_TIERS), help="Storage tier", default="hour")
+    trend.add_argument("--metric", choices=RRD_FIELDS, help="Metric to show", default="download")
+
+    agent = subparsers.add_parser("agent", parents=[test_options], allow_abbrev=False,
+                                  help="Run stress tests and stream every iteration to a collector")
+    agent.add_argument("--collector", required=True, help="Collector address, host:port")
+    agent.add_argument("--agent-id", help="Name reported to the collector (default: hostname)", default=None)
+
+    collector = subparsers.add_parser("collector", help="Receive and aggregate results from agents")
+    collector.add_argument("--host", help="Address to bind", default="0.0.0.0")
+    collector.add_argument("--port", type=int, help="TCP port", default=COLLECTOR_PORT)
+    collector.add_argument("--report-interval", type=float, help="Seconds between fleet summaries", default=10)
+    collector.add_argument("--csv", dest="fleet_csv", help="Also append every received sample to this CSV", default=None)
     return parser.parse_args()
 
 def main():
-    print(Fore.LIGHTBLUE_EX + BANNER)
-
     args = parse_args()
 
+    signal.signal(signal.SIGINT, signal_handler)
+
+    # Headless runs (cron/systemd) never touch the terminal: no colorama, no banner, no live view
+    if not getattr(args, "headless", False):
+        enable_color()
+        # `query` writes CSV to stdout, so its banner goes to stderr
+        print(Fore.LIGHTBLUE_EX + BANNER, file=sys.stderr if args.command == "query" else sys.stdout)
+
+    if args.command == "serve":
+        run_server(args.host, args.port, args.serve_echo_port)
+        return
+    if args.command == "report":
+        run_report(args.logs, args.bucket, args.workers, args.worst, args.json_path)
+        return
+    if args.command == "trend":
+        run_trend(args.trend_rrd, args.tier, args.metric)
+        return
+    if args.command == "query":
+        run_query(args.start, args.end, args.logs, args.files, args.out)
+        return
+    if args.command == "rescore":
+        run_rescore(args.logs, args.files, args.rescore_out, args.weights)
+        return
+    if args.command == "collector":
+        run_collector(args.host, args.port, args.report_interval, args.fleet_csv)
+        return
+
+    if args.trace:
+        start_trace(args.trace)
+    try:
+        if args.command == "replay":
+            run_replay(args.logs, args.files, args.replay_out, args.speed, args.weights, args.headless, args.max_fps,
+                       args.metrics_port, args.metrics_host, args.rrd, args.profile)
+        elif args.profile_hook:
+            run_profiled(args.profile_hook, args.profile_out, run_tests, args)
+        else:
+            run_tests(args)
+    finally:
+        stop_trace()
+
+# Default command (and `agent`): a single test or a stress run
+def run_tests(args):
     if args.run > 0:
         print(Fore.YELLOW + f"Starting test in {args.run} seconds...")
         time.sleep(args.run)
 
     stress_duration = None
+    if args.command == "agent" and not args.stress:
+        args.stress = "Y"  # agents stream until stopped
     if args.stress:
         if args.stress.upper() in STRESS_MODES:
             stress_duration = STRESS_MODES[args.stress.upper()]
@@ -307,16 +2989,75 @@ def main():
     test_map = {"U": "U", "D": "D", "P": "P"}
     test_type = test_map.get(args.test.upper(), "ALL")
 
+    servers = [t.strip() for t in (args.servers or "").split(",") if t.strip()]
+
+    if args.adaptive and args.engine != "native":
+        print(Fore.RED + "--adaptive needs the native engine (-E native); speedtest-cli always runs its full-length test.")
+        sys.exit(1)
+
+    engine_options = None
+    if args.engine == "native":
+        args.endpoint = args.endpoint or (servers[0] if servers else None)
+        if not args.endpoint:
+            print(Fore.RED + "The native engine needs --endpoint (e.g. http://host:8080).")
+            sys.exit(1)
+        engine_options = {
+            "endpoint": args.endpoint, "streams": args.streams,
+            "duration": args.duration, "echo_port": args.echo_port,
+            "adaptive": args.adaptive, "min_duration": args.min_duration,
+        }
+    elif args.engine == "speedtest":
+        engine_options = {"ttl": args.cache_ttl}
+
+    try:
+        hosts = load_hosts(args.hosts, args.hosts_file)
+    except OSError as e:
+        print(Fore.RED + f"Could not read hosts file: {e}")
+        sys.exit(1)
+
+    # ICMP probes need ping3: fail before the first transfer rather than in the middle of a run
+    echo_port = _latency_target(args.engine, engine_options)[1]
+    if test_type in ["ALL", "P"] and (any("://" not in h for h in hosts) if hosts else not echo_port) or \
+            (args.bufferbloat and not echo_port):
+        load_ping()
+
+    # Day- and year-long runs keep bounded-size trend storage by default
+    rrd = args.rrd
+    if rrd is None and stress_duration and stress_duration >= STRESS_MODES["D"]:
+        rrd = RRD_DEFAULT_PATH
+    if rrd == "off":
+        rrd = None
+
+    log_options = {
+        "flush_rows": args.log_flush_rows,
+        "flush_interval": args.log_flush_secs,
+        "fsync": args.log_fsync,
+        "rotate_bytes": int(args.log_rotate_mb * 1024 * 1024),
+        "rotate_interval": args.log_rotate_hours * 3600,
+        "compress": args.log_gzip,
+        "timeline": args.timeline,
+    }
+
     if stress_duration:
-        stress_test(stress_duration, test_type, args.ping, args.timeout)
+        stress_test(stress_duration, test_type, args.ping, args.timeout, args.engine, engine_options, args.bufferbloat,
+                    hosts, args.probe_interval, log_options, args.binlog, rrd, args.interval, args.overrun,
+                    servers, args.fanout, getattr(args, "collector", None), getattr(args, "agent_id", None),
+                    args.metrics_port, args.metrics_host, args.headless, args.max_fps, args.profile)
     else:
-        result = run_speed_test(test_type, args.ping, args.timeout)
+        phases = None
+        if args.profile:
+            enable_phases()
+            phases = PhaseProfile()
+        with timed(None, "test", {"test": test_type}):
+            result = run_speed_test(test_type, args.ping, args.timeout, args.engine, engine_options, args.bufferbloat,
+                                    hosts, args.probe_interval, servers, args.fanout)
         score = calculate_health_score(
             result.get("download", 0),
             result.get("upload", 0),
             result.get("ping", 0),
             result.get("jitter", 0),
             result.get("latency", 0),
+            result.get("bufferbloat"),
         )
         print(Fore.GREEN + "\n=== Test Result ===")
         print(Fore.CYAN + f"Download: {result.get('download', 'N/A')} Mbps")
@@ -324,7 +3065,31 @@ def main():
         print(Fore.CYAN + f"Ping:     {result.get('ping', 'N/A')} ms")
         print(Fore.CYAN + f"Jitter:   {result.get('jitter', 'N/A')} ms")
         print(Fore.CYAN + f"Latency:  {result.get('latency', 'N/A')} ms")
+        if "timeline" in result:
+            print(Fore.CYAN + render_steady(result))
+        if args.adaptive:
+            print(Fore.CYAN + "Duration: " + " | ".join(
+                f"{label} {result[f'{d}_duration']} s" for d, label in (("download", "DL"), ("upload", "UL"))
+                if f"{d}_duration" in result) + f" (max {args.duration} s)")
+        for target, r in result.get("servers", {}).items():
+            if r:
+                print(Fore.CYAN + f"  {target:<24} DL {r.get('download', 'N/A')} Mbps, UL {r.get('upload', 'N/A')} Mbps, ping {r.get('ping', 'N/A')} ms")
+            else:
+                print(Fore.RED + f"  {target:<24} failed")
+        for target, probe in result.get("probes", {}).items():
+            if probe["received"]:
+                print(Fore.CYAN + f"  {target:<24} avg {probe['avg']} ms, min {probe['min']} ms, max {probe['max']} ms, jitter {probe['jitter']} ms, loss {probe['loss']}%")
+            else:
+                print(Fore.RED + f"  {target:<24} no replies ({probe['sent']} sent)")
+        if args.bufferbloat:
+            for phase, rtt in result.get("rtt", {}).items():
+                print(Fore.CYAN + f"RTT {phase:<8} p50 {rtt['p50']} ms, p90 {rtt['p90']} ms, max {rtt['max']} ms ({rtt['samples']} samples, {rtt['lost']} lost)")
+            if "bufferbloat" in result:
+                print(Fore.CYAN + f"Bloat:    +{result['bufferbloat']} ms under load (grade {result['bufferbloat_grade']})")
         print(render_health_bar(score))
+        if phases:
+            phases.add(take_phases())
+            phases.print_summary()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
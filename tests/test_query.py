@@ -0,0 +1,43 @@
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import speedo  # noqa: E402
+
+ROWS_PER_SECOND = 600  # > INDEX_BLOCK_ROWS, so several index blocks start in the same second
+
+# Write 3 seconds of rows at ROWS_PER_SECOND and return (path, first second as epoch)
+def write_dense_log(directory):
+    logger = speedo.CsvLogger(flush_rows=1000, directory=str(directory))
+    first = datetime(2025, 8, 6, 16, 0, 0)
+    for second in range(3):
+        for i in range(ROWS_PER_SECOND):
+            logger.log({"download": float(i), "upload": 1.0, "ping": 1.0, "jitter": 1.0, "latency": 1.0}, 100,
+                       first + timedelta(seconds=second))
+    logger.close()
+    return logger.filename, first.timestamp()
+
+def test_query_repeated_timestamps_with_index(tmp_path):
+    path, first = write_dense_log(tmp_path)
+    assert os.path.exists(path + ".idx")
+    rows = list(speedo.query_log_range(path, first + 1, first + 2))
+    assert len(rows) == ROWS_PER_SECOND
+    assert [float(r["download_mbps"]) for r in rows] == [float(i) for i in range(ROWS_PER_SECOND)]
+
+def test_query_rebuilt_index(tmp_path):
+    path, first = write_dense_log(tmp_path)
+    os.remove(path + ".idx")
+    assert len(list(speedo.query_log_range(path, first + 1, first + 3))) == 2 * ROWS_PER_SECOND
+    assert os.path.exists(path + ".idx")
+
+def test_query_without_writable_index(tmp_path, monkeypatch):
+    path, first = write_dense_log(tmp_path)
+    os.remove(path + ".idx")
+
+    def read_only(path):
+        raise PermissionError(13, "Permission denied", path + ".idx")
+
+    monkeypatch.setattr(speedo, "build_log_index", read_only)
+    assert len(list(speedo.query_log_range(path, first, first + 1))) == ROWS_PER_SECOND
@@ -0,0 +1,71 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import speedo  # noqa: E402
+
+START = 1754496000  # an exact hour (and day) boundary
+DAY = 24 * 3600
+
+def result(download):
+    return {"download": download, "upload": 10.0, "ping": 5.0, "jitter": 1.0, "latency": "N/A"}
+
+def test_minute_rollup_min_mean_max_count(tmp_path):
+    store = speedo.RoundRobinStore(str(tmp_path / "speedo.rrd"))
+    for second, download in enumerate([100.0, 50.0, 150.0]):
+        store.update(result(download), 90, START + second)
+    rows = store.fetch("minute", now=START + 59)
+    store.close()
+    assert len(rows) == 1
+    stamp, fields = rows[0]
+    assert stamp == START
+    assert fields["download"] == (50.0, 100.0, 150.0, 3.0)
+    assert fields["score"] == (90.0, 90.0, 90.0, 3.0)
+    assert fields["latency"][3] == 0  # N/A never counts
+
+def test_minute_slot_recycled_after_a_day(tmp_path):
+    store = speedo.RoundRobinStore(str(tmp_path / "speedo.rrd"))
+    store.update(result(100.0), 90, START)
+    store.update(result(40.0), 70, START + DAY)  # same slot, one tier length later
+    rows = store.fetch("minute", now=START + DAY)
+    store.close()
+    assert [stamp for stamp, _ in rows] == [START + DAY]
+    assert rows[0][1]["download"] == (40.0, 40.0, 40.0, 1.0)
+
+def test_hour_tier_keeps_what_the_minute_tier_dropped(tmp_path):
+    store = speedo.RoundRobinStore(str(tmp_path / "speedo.rrd"))
+    store.update(result(100.0), 90, START)
+    store.update(result(40.0), 70, START + DAY)
+    rows = store.fetch("hour", now=START + DAY)
+    store.close()
+    assert [stamp for stamp, _ in rows] == [START, START + DAY]
+
+def test_raw_ring_overwrites_oldest(tmp_path):
+    store = speedo.RoundRobinStore(str(tmp_path / "speedo.rrd"))
+    for second in range(speedo.RRD_RAW_SLOTS + 5):
+        store.update(result(float(second)), 90, START + second)
+    rows = store.fetch("raw", now=START + speedo.RRD_RAW_SLOTS + 4)
+    store.close()
+    assert len(rows) == speedo.RRD_RAW_SLOTS
+    assert rows[0][0] == START + 5
+    assert rows[-1][1]["download"] == speedo.RRD_RAW_SLOTS + 4
+
+def test_reopen_keeps_data(tmp_path):
+    path = str(tmp_path / "speedo.rrd")
+    store = speedo.RoundRobinStore(path)
+    store.update(result(100.0), 90, START)
+    store.close()
+    store = speedo.RoundRobinStore(path)
+    store.update(result(50.0), 80, START + 1)
+    rows = store.fetch("minute", now=START + 1)
+    store.close()
+    assert rows[0][1]["download"] == (50.0, 75.0, 100.0, 2.0)
+
+def test_rejects_foreign_file(tmp_path):
+    path = tmp_path / "speedo.rrd"
+    path.write_bytes(b"not a store")
+    with pytest.raises(ValueError):
+        speedo.RoundRobinStore(str(path))
@@ -0,0 +1,84 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import speedo  # noqa: E402
+
+INTERVAL = 10
+DURATION = 100
+
+# Fake monotonic clock: sleep() advances it, work() stands in for an iteration's run time
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+    def work(self, seconds):
+        self.now += seconds
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(speedo.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(speedo.time, "sleep", clock.sleep)
+    return clock
+
+def test_on_time_iterations_follow_the_grid(clock):
+    scheduler = speedo.IterationScheduler(INTERVAL, DURATION)
+    starts = []
+    while (lag := scheduler.wait()) is not None:
+        assert lag == 0
+        starts.append(clock.now - 1000)
+        clock.work(3)
+    assert starts == [0, 10, 20, 30, 40, 50, 60, 70, 80, 90]
+    assert (scheduler.overruns, scheduler.skipped, scheduler.coalesced) == (0, 0, 0)
+
+def test_skip_drops_missed_slots_and_realigns(clock):
+    scheduler = speedo.IterationScheduler(INTERVAL, DURATION, "skip")
+    assert scheduler.wait() == 0
+    clock.work(25)  # misses the 10 and 20 slots
+    assert scheduler.wait() == 0
+    assert clock.now - 1000 == 30
+    assert (scheduler.overruns, scheduler.skipped, scheduler.coalesced) == (1, 2, 0)
+
+def test_immediate_runs_late_iterations_back_to_back(clock):
+    scheduler = speedo.IterationScheduler(INTERVAL, DURATION, "immediate")
+    assert scheduler.wait() == 0
+    clock.work(25)
+    assert scheduler.wait() == 15  # the 10 slot, started at 25
+    assert scheduler.wait() == 5   # the 20 slot, right after it
+    assert scheduler.wait() == 0   # caught up: sleeps to 30
+    assert clock.now - 1000 == 30
+    assert (scheduler.overruns, scheduler.skipped, scheduler.coalesced) == (2, 0, 0)
+
+def test_coalesce_merges_missed_slots_into_one_run(clock):
+    scheduler = speedo.IterationScheduler(INTERVAL, DURATION, "coalesce")
+    assert scheduler.wait() == 0
+    clock.work(25)
+    assert scheduler.wait() == 15  # one late run stands in for the 10 and 20 slots
+    assert scheduler.wait() == 0
+    assert clock.now - 1000 == 30
+    assert (scheduler.overruns, scheduler.skipped, scheduler.coalesced) == (1, 0, 1)
+
+def test_small_slips_are_not_overruns(clock):
+    scheduler = speedo.IterationScheduler(INTERVAL, DURATION, "skip")
+    scheduler.wait()
+    clock.work(INTERVAL + INTERVAL * speedo.SCHEDULE_TOLERANCE / 2)
+    assert scheduler.wait() == pytest.approx(INTERVAL * speedo.SCHEDULE_TOLERANCE / 2)
+    assert scheduler.overruns == 0
+
+def test_run_ends_at_duration(clock):
+    scheduler = speedo.IterationScheduler(INTERVAL, 25)
+    assert [scheduler.wait() for _ in range(4)] == [0, 0, 0, None]
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        speedo.IterationScheduler(INTERVAL, DURATION, "later")
@@ -0,0 +1,58 @@
+import itertools
+import math
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import speedo  # noqa: E402
+
+np = pytest.importorskip("numpy")
+
+# Scalar scores for rows of (download, upload, ping, jitter, latency, bloat), NaN = N/A
+def scalar_scores(rows, weights=speedo.HEALTH_WEIGHTS):
+    scores = []
+    for row in rows:
+        values = ["N/A" if isinstance(v, float) and math.isnan(v) else v for v in row]
+        scores.append(speedo.calculate_health_score(*values, weights=weights))
+    return scores
+
+def vector_scores(rows, weights=speedo.HEALTH_WEIGHTS):
+    columns = np.array(rows, dtype=np.float64).T
+    return speedo.health_scores(*columns[:5], bloat=columns[5], weights=weights).tolist()
+
+# Grid across every cap, plus N/A in each column
+GRID = list(itertools.product(
+    [0.0, 12.5, 99.99, 250.0, 1000.0, math.nan],
+    [0.0, 5.0, 49.99, 200.0],
+    [0.0, 8.3, 45.0, 400.0, math.nan],
+    [0.0, 2.75, 30.0],
+    [0.0, 11.1, 150.0, math.nan],
+    [math.nan, -3.0, 0.0, 25.0, 900.0],
+))
+
+# Log-like rows: 2-decimal values, where near-ties in round(score, 1) are common
+rng = random.Random(0)
+LOG_ROWS = [
+    (round(rng.uniform(0, 600), 2), round(rng.uniform(0, 120), 2), round(rng.uniform(1, 120), 2),
+     round(rng.uniform(0, 40), 2), round(rng.uniform(1, 200), 2), round(rng.uniform(-5, 300), 2))
+    for _ in range(20000)
+]
+
+def test_grid_matches_scalar_scorer():
+    assert vector_scores(GRID) == scalar_scores(GRID)
+
+def test_log_rows_match_scalar_scorer():
+    assert vector_scores(LOG_ROWS) == scalar_scores(LOG_ROWS)
+
+def test_custom_weights_match_scalar_scorer():
+    weights = speedo.parse_weights("ping_cap=50,download_full_mbps=1000,bufferbloat_cap=40")
+    assert vector_scores(LOG_ROWS, weights) == scalar_scores(LOG_ROWS, weights)
+
+def test_without_bloat_column():
+    rows = [row[:5] for row in LOG_ROWS[:1000]]
+    columns = np.array(rows, dtype=np.float64).T
+    assert speedo.health_scores(*columns).tolist() == [speedo.calculate_health_score(*row) for row in rows]
@@ -0,0 +1,61 @@
+import math
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import speedo  # noqa: E402
+
+VALUES = [0.5 * 1.013 ** i for i in range(1500)]  # spans 0.5 .. ~130k, well past one bucket
+
+# Value the sketch's rank rule points at, read from the sorted input
+def exact_quantile(values, q):
+    ordered = sorted(values)
+    return ordered[math.floor(q / 100 * (len(ordered) - 1))]
+
+def sketch_of(values, **kwargs):
+    sketch = speedo.QuantileSketch(**kwargs)
+    for value in values:
+        sketch.add(value)
+    return sketch
+
+def test_quantiles_within_relative_accuracy():
+    sketch = sketch_of(VALUES)
+    for q in speedo.QUANTILES + [0, 10, 25, 75, 100]:
+        exact = exact_quantile(VALUES, q)
+        assert abs(sketch.quantile(q) - exact) <= speedo.SKETCH_ACCURACY * exact
+
+def test_zeros_and_missing_values():
+    sketch = sketch_of([0, 0, 0, "N/A", None, 10])
+    assert sketch.count == 4
+    assert sketch.quantile(50) == 0
+    assert sketch.quantile(100) == pytest.approx(10, rel=speedo.SKETCH_ACCURACY)
+
+def test_empty_sketch():
+    assert speedo.QuantileSketch().quantile(50) is None
+
+def test_merge_matches_single_sketch():
+    merged = sketch_of(VALUES[::2]).merge(sketch_of(VALUES[1::2]))
+    single = sketch_of(VALUES)
+    assert merged.buckets == single.buckets
+    assert (merged.count, merged.min, merged.max) == (single.count, single.min, single.max)
+
+def test_add_array_matches_add():
+    np = pytest.importorskip("numpy")
+    values = VALUES + [0.0, 0.0, 100.0, 100.0]
+    bulk = speedo.QuantileSketch()
+    bulk.add_array(np.array(values + [math.nan]))
+    single = sketch_of(values)
+    assert bulk.buckets == single.buckets
+    assert (bulk.count, bulk.zero_count, bulk.min, bulk.max) == \
+           (single.count, single.zero_count, single.min, single.max)
+
+def test_collapse_bounds_memory_and_keeps_upper_tail():
+    sketch = sketch_of(VALUES, max_buckets=100)
+    assert len(sketch.buckets) <= 100
+    assert sketch.count == len(VALUES)
+    for q in (90, 99, 99.9):
+        exact = exact_quantile(VALUES, q)
+        assert abs(sketch.quantile(q) - exact) <= speedo.SKETCH_ACCURACY * exact